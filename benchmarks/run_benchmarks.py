@@ -0,0 +1,374 @@
+"""Time the hot paths of the fitting workflow on the example data.
+
+Run from the repository root:
+
+    python benchmarks/run_benchmarks.py --save NAME
+        Time every benchmark and save the results as the baseline NAME in
+        benchmarks/baselines/NAME.json.
+    python benchmarks/run_benchmarks.py --compare NAME
+        Time every benchmark and report the ones slower than the baseline
+        NAME by more than the threshold. The exit status is 1 if any is.
+
+Use --only to run some of the benchmarks, e.g. --only residual clone.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from importlib import metadata
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+DATA_DIR = REPO_DIR / "example" / "data"
+# PDFFitLauncher is a script in src, outside of the package.
+sys.path.insert(0, str(REPO_DIR / "src"))
+# The launcher creates its plot window without showing it.
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from agents_for_diffpy.interface import (  # noqa: E402
+    FitDAG,
+    FitRunner,
+    PDFAdapter,
+    input_cache,
+)
+from PDFFitLauncher import PDFFitLauncher  # noqa: E402
+
+PROFILES = sorted((DATA_DIR / "sequential_fit").glob("*.gr"))
+STRUCTURE = DATA_DIR / "Ni.cif"
+FIT_SETTINGS = {
+    "xmin": 1.5,
+    "xmax": 50,
+    "dx": 0.01,
+    "qmax": 25.0,
+    "qmin": 0.1,
+    "remove_vars": ["delta1"],
+}
+PAYLOAD = {
+    "scale": 0.4,
+    "a": 3.52,
+    "Uiso_0": 0.005,
+    "delta2": 2.0,
+    "qdamp": 0.04,
+    "qbroad": 0.02,
+}
+TEMPLATE = "a->scale->qdamp->Uiso_0->delta2->all"
+# The environment recorded with the baselines
+PACKAGES = ["numpy", "scipy", "networkx", "diffpy.srfit", "diffpy.srreal"]
+
+
+def get_inputs(profile):
+    return {
+        "profile_string": profile.read_text(),
+        "structure_string": STRUCTURE.read_text(),
+        **FIT_SETTINGS,
+    }
+
+
+def get_loaded_adapter():
+    adapter = PDFAdapter()
+    adapter.load_inputs(get_inputs(PROFILES[0]))
+    adapter.apply_payload(PAYLOAD)
+    return adapter
+
+
+def get_completed_dag():
+    dag = FitDAG()
+    dag.from_str(TEMPLATE)
+    FitRunner()._run_dag(dag, PDFAdapter, get_inputs(PROFILES[0]), PAYLOAD)
+    return dag
+
+
+# Each benchmark returns a function preparing one run, which returns the
+# function to time. Only the returned function is timed.
+
+
+def bench_load_inputs(options):
+    inputs = get_inputs(PROFILES[0])
+
+    def setup():
+        # Time the parsing too.
+        input_cache.clear()
+        adapter = PDFAdapter()
+        return lambda: adapter.load_inputs(inputs)
+
+    return setup
+
+
+def bench_load_inputs_cached(options):
+    inputs = get_inputs(PROFILES[0])
+    PDFAdapter().load_inputs(inputs)
+
+    def setup():
+        adapter = PDFAdapter()
+        return lambda: adapter.load_inputs(inputs)
+
+    return setup
+
+
+def bench_residual(options):
+    adapter = get_loaded_adapter()
+    adapter.free_parameters(["all"])
+    p = adapter._recipe.values
+
+    def setup():
+        return lambda: adapter._residual(p)
+
+    return setup
+
+
+def bench_least_squares_node(options):
+    def setup():
+        adapter = get_loaded_adapter()
+        return adapter.action_func_factory(["all"])
+
+    return setup
+
+
+def bench_run_dag(options):
+    inputs = get_inputs(PROFILES[0])
+    template_dag = FitDAG()
+    template_dag.from_str(TEMPLATE)
+
+    def setup():
+        dag = template_dag.instantiate()
+        runner = FitRunner()
+        return lambda: runner._run_dag(dag, PDFAdapter, inputs, PAYLOAD)
+
+    return setup
+
+
+def bench_clone(options):
+    adapter = get_loaded_adapter()
+    adapter.free_parameters(["a", "scale"])
+
+    def setup():
+        return adapter.clone
+
+    return setup
+
+
+def bench_to_json(options):
+    dag = get_completed_dag()
+    filename = Path(options.tmpdir) / "dag.json"
+
+    def setup():
+        return lambda: dag.to_json(filename)
+
+    return setup
+
+
+def bench_from_json(options):
+    filename = Path(options.tmpdir) / "dag.json"
+    get_completed_dag().to_json(filename)
+
+    def setup():
+        return lambda: FitDAG().from_json(filename)
+
+    return setup
+
+
+def bench_to_binary(options):
+    dag = get_completed_dag()
+    filename = Path(options.tmpdir) / "dag.fitdag"
+
+    def setup():
+        return lambda: dag.to_binary(filename)
+
+    return setup
+
+
+def bench_read_binary_payload(options):
+    filename = Path(options.tmpdir) / "dag.fitdag"
+    get_completed_dag().to_binary(filename)
+
+    def setup():
+        return lambda: FitDAG.read_binary_payload(filename)
+
+    return setup
+
+
+def bench_launcher_batch(options):
+    # A single launcher, as it owns the Qt application.
+    launcher = PDFFitLauncher()
+    template_dag = FitDAG()
+    template_dag.from_str(TEMPLATE)
+
+    def setup():
+        dump_folder = Path(tempfile.mkdtemp(dir=options.tmpdir))
+        launcher.last_payload = None
+        launcher.set_meta_inputs(
+            profile_folder=DATA_DIR / "sequential_fit",
+            structure_file=STRUCTURE,
+            initial_payload=PAYLOAD,
+            dump_folder=dump_folder,
+            dump_filename="fit_results",
+            template_dag=template_dag,
+            **FIT_SETTINGS,
+        )
+        launcher._check_for_new_profiles()
+        launcher.profiles_running = launcher.profiles_running[
+            : options.profiles
+        ]
+        return launcher._launch
+
+    return setup
+
+
+BENCHMARKS = {
+    "load_inputs": bench_load_inputs,
+    "load_inputs_cached": bench_load_inputs_cached,
+    "residual": bench_residual,
+    "least_squares_node": bench_least_squares_node,
+    "run_dag": bench_run_dag,
+    "clone": bench_clone,
+    "to_json": bench_to_json,
+    "from_json": bench_from_json,
+    "to_binary": bench_to_binary,
+    "read_binary_payload": bench_read_binary_payload,
+    "launcher_batch": bench_launcher_batch,
+}
+# The number of runs of the fast benchmarks is multiplied by this factor.
+FAST_BENCHMARKS = {
+    "residual": 20,
+    "clone": 20,
+    "to_json": 20,
+    "from_json": 20,
+    "to_binary": 20,
+    "read_binary_payload": 20,
+}
+
+
+def time_benchmark(name, options):
+    setup = BENCHMARKS[name](options)
+    repeat = options.repeat * FAST_BENCHMARKS.get(name, 1)
+    times = []
+    for _ in range(repeat):
+        func = setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    result = {
+        "median": statistics.median(times),
+        "min": min(times),
+        "repeat": repeat,
+    }
+    if name == "launcher_batch":
+        result["profiles_per_second"] = options.profiles / result["median"]
+    return result
+
+
+def get_environment():
+    environment = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    for package in PACKAGES:
+        try:
+            environment[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            environment[package] = None
+    return environment
+
+
+def compare(results, baseline, threshold):
+    """Print the results against the baseline and get the regressions."""
+    regressions = []
+    print(f"\n{'benchmark':<22}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            print(f"{name:<22}{'-':>12}{result['median']:>12.4g}")
+            continue
+        reference = baseline["results"][name]["median"]
+        ratio = result["median"] / reference
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<22}{reference:>12.4g}{result['median']:>12.4g}"
+            f"{ratio:>8.2f}{flag}"
+        )
+    environment = get_environment()
+    for key, value in baseline["environment"].items():
+        if environment.get(key) != value:
+            print(f"{key} changed: {value} -> {environment.get(key)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=list(BENCHMARKS),
+        help="The benchmarks to run. Default is all of them.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="The number of runs of each benchmark. Default is 3.",
+    )
+    parser.add_argument(
+        "--profiles",
+        type=int,
+        default=4,
+        help="The number of profiles fitted by launcher_batch. Default is 4.",
+    )
+    parser.add_argument("--save", help="Save the results as this baseline.")
+    parser.add_argument("--compare", help="Compare with this baseline.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="The relative slowdown reported as a regression. Default is "
+        "0.1.",
+    )
+    options = parser.parse_args()
+    baseline = None
+    if options.compare:
+        with open(BASELINE_DIR / f"{options.compare}.json", "r") as f:
+            baseline = json.load(f)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        options.tmpdir = tmpdir
+        for name in options.only or BENCHMARKS:
+            # The runner and the launcher report their progress.
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[name] = time_benchmark(name, options)
+            print(
+                f"{name:<22}median {results[name]['median']:.4g} s, "
+                f"min {results[name]['min']:.4g} s"
+            )
+    if options.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        with open(BASELINE_DIR / f"{options.save}.json", "w") as f:
+            json.dump(
+                {
+                    "created": datetime.datetime.now().isoformat(),
+                    "environment": get_environment(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    if baseline is not None:
+        regressions = compare(results, baseline, options.threshold)
+        if regressions:
+            print(f"\nRegressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
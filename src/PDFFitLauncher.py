@@ -3,12 +3,57 @@ from agents_for_diffpy.interface import (
     FitRunner,
     FitPlotter,
     PDFAdapter,
+    ProfileRegistry,
+    ProfileWatcher,
+    ResultsStore,
+    pool_registry,
 )
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import re
-import time
 import threading
-import networkx as nx
+import time
+import warnings
+
+# The adapter reused by the successive fits of a worker process
+_worker_adapter = None
+
+
+def _init_worker():
+    # Several profiles are fitted at the same time, so the PDF calculation
+    # of each of them runs serially.
+    pool_registry.configure(ncpu=1)
+
+
+def _fit_profile(template_dag, inputs, payload):
+    """Fit one profile in a worker process and return the completed DAG."""
+    global _worker_adapter
+    if _worker_adapter is None:
+        _worker_adapter = PDFAdapter()
+    dag = template_dag.instantiate()
+    FitRunner()._run_dag(
+        dag,
+        Adapter=PDFAdapter,
+        inputs=inputs,
+        payload=payload,
+        adapter=_worker_adapter,
+    )
+    # The adapters stay in the worker.
+    for node_id in dag.nodes:
+        dag.nodes[node_id]["buffer"] = None
+    return dag
+
+
+def _max_relative_deviation(payload, reference):
+    """Get the largest relative difference between the values of two
+    payloads."""
+    deviation = 0.0
+    for pname, value in reference.items():
+        if pname not in payload:
+            continue
+        scale = max(abs(value), 1e-12)
+        deviation = max(deviation, abs(payload[pname] - value) / scale)
+    return deviation
 
 
 class PDFFitLauncher:
@@ -19,90 +64,377 @@ class PDFFitLauncher:
         self.template_dag = None
         self.last_payload = None
         self.filename_pattern = None
-        self.profiles_known = []
-        self.profiles_finished = []
+        # The known and finished profiles, sorted by the order extracted
+        # from the file names
+        self.profiles = ProfileRegistry()
+        self.profile_watcher = None
+        self.watcher_backend = "auto"
         self.profiles_running = []
         self.runner = FitRunner()
+        # Reused across profiles so that only the profile data is swapped
+        # when the r-grid and the fit settings do not change.
+        self.adapter = PDFAdapter()
         self.plotter = FitPlotter()
+        # Pipelined mode, see set_pipeline
+        self.n_inflight = 1
+        self.rerun_tolerance = None
+        self._executor = None
+        # See set_results_store
+        self.results_store = None
+        self.write_files = True
+        # The format of the result files, see set_meta_inputs
+        self.dump_format = "json"
+        # See set_tracer
+        self.tracer = None
+        self.trace_file = None
 
-    def _check_for_new_profiles(self):
+    def _check_for_new_profiles(self, timeout=0.0):
+        """Add the new complete profiles to the known profiles.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait for a new profile, in seconds. Default
+            is 0, which does not wait.
+        """
         if not self.profile_folder:
             raise ValueError("Profile folder is not set.")
         if not self.structure_file:
             raise ValueError("Structure file is not set.")
-        files = [file for file in self.profile_folder.glob("*")]
-        order = [
-            int(re.findall(self.filename_pattern, file.name)[0])
-            for file in files
-        ]
-        files = [file for _, file in sorted(zip(order, files))]
-        if self.profiles_known != files[: len(self.profiles_known)]:
-            raise ValueError(
-                "Profiles order has changed. "
-                "Please ensure newer profiles are strictly have higher "
-                "indices."
+        if self.profile_watcher is None:
+            self.profile_watcher = ProfileWatcher(
+                self.profile_folder,
+                pattern=self.filename_pattern,
+                backend=self.watcher_backend,
             )
-        self.profiles_known = files
-        self.profiles_running = [
-            file
-            for file in self.profiles_known
-            if file not in self.profiles_finished
-        ]
+        start = time.time()
+        new_files = self.profile_watcher.poll(timeout)
+        if self.tracer is not None and new_files:
+            self.tracer.add_span(
+                "profile discovery",
+                start,
+                time.time(),
+                category="launcher",
+                args={"new_profiles": len(new_files)},
+            )
+        new_files = sorted(new_files, key=self._get_profile_order)
+        for file in new_files:
+            self.profiles.add(file, self._get_profile_order(file))
+        self.profiles_running = self.profiles.pending()
+
+    def _get_profile_order(self, file):
+        return int(re.findall(self.filename_pattern, file.name)[0])
 
     def set_start_profile(self, start_from):
         if start_from is None:
             return
         else:
             self._check_for_new_profiles()
-            ind = self.profiles_known.index(
-                Path(self.profile_folder / start_from)
+            ind = self.profiles.index(Path(self.profile_folder / start_from))
+            known = self.profiles.known
+            for profile in known[:ind]:
+                self.profiles.mark_finished(profile)
+            # The profiles from the start one on are fitted again, even if
+            # the registry file recorded them as finished.
+            for profile in known[ind:]:
+                self.profiles.mark_pending(profile)
+            self.profiles_running = self.profiles.pending()
+            self.last_payload = self._read_result_payload(Path(start_from))
+
+    def _read_result_payload(self, profile):
+        """Get the final payload stored for a profile."""
+        if self.results_store is not None:
+            if profile.stem not in self.results_store:
+                raise ValueError(f"No result stored for profile {profile}")
+            return self.results_store.payload(profile.stem)
+        result_file = self._get_result_file(profile)
+        if not result_file.exists():
+            raise ValueError(f"No result file found for profile {profile}")
+        if self.dump_format == "binary":
+            # Only the final payload is decoded.
+            return FitDAG.read_binary_payload(result_file)
+        dag = FitDAG()
+        dag.from_json(result_file)
+        return dag.nodes[dag.topological_order[-1]]["payload"]
+
+    def _restore_last_payload(self):
+        """Seed the next fit with the result of the last finished profile,
+        e.g. after a restart with a registry file."""
+        profile = self.profiles.last_finished()
+        if profile is None:
+            return
+        try:
+            self.last_payload = self._read_result_payload(profile)
+        except ValueError:
+            warnings.warn(
+                f"No result found for the finished profile {profile.name}. "
+                "The next profile starts from the initial payload."
+            )
+
+    def _get_result_file(self, profile):
+        suffix = ".fitdag" if self.dump_format == "binary" else ".json"
+        return (
+            self.dump_folder / f"{self.dump_filename}_{profile.stem}{suffix}"
+        )
+
+    def _get_inputs(self, profile):
+        return {
+            "profile_string": profile.read_text(),
+            "structure_string": self.structure_file.read_text(),
+            **self.inputs_kwargs,
+        }
+
+    def _finish_profile(self, profile, dag):
+        last_node_id = dag.topological_order[-1]
+        self.last_payload = dag.nodes[last_node_id]["payload"]
+        with self.runner._trace(
+            "write results", category="launcher", profile=profile.stem
+        ):
+            if self.results_store is not None:
+                self.results_store.append(
+                    profile.stem, dag, order=self._get_profile_order(profile)
+                )
+            if self.write_files:
+                if self.dump_format == "binary":
+                    dag.to_binary(self._get_result_file(profile))
+                else:
+                    dag.to_json(self._get_result_file(profile))
+        self.profiles.mark_finished(profile)
+        print(f"Finsihed {len(self.profiles.finished)} fit tasks.")
+
+    def set_results_store(self, path, write_files=False):
+        """Store the results in a single SQLite file.
+
+        Parameters
+        ----------
+        path : Path or str
+            The SQLite file, created if it does not exist. The results
+            already stored in it are kept.
+        write_files : bool, optional
+            Whether to also write one result file per profile into the dump
+            folder. Default is False.
+        """
+        if self.results_store is not None:
+            self.results_store.close()
+        self.results_store = ResultsStore(path)
+        self.write_files = write_files
+
+    def set_checkpoint(self, path):
+        """Save the completed nodes of the running fit to a file.
+
+        When the launcher is restarted with the same checkpoint file, the
+        interrupted profile is resumed from its last completed node. Only
+        the serial mode is checkpointed. See FitRunner.set_checkpoint.
+
+        Parameters
+        ----------
+        path : Path or str or None
+            The checkpoint file. None stops the checkpointing.
+        """
+        self.runner.set_checkpoint(path)
+        self._warn_unused_in_pipeline()
+
+    def set_result_cache(self, result_cache):
+        """Reuse the payloads of the nodes computed before, e.g. when a
+        folder is processed again. Only the serial mode uses the cache. See
+        FitRunner.set_result_cache.
+
+        Parameters
+        ----------
+        result_cache : ResultCache or None
+            The cache. None stops the caching.
+        """
+        self.runner.set_result_cache(result_cache)
+        self._warn_unused_in_pipeline()
+
+    def set_tracer(self, tracer, trace_file=None, residual_every=100):
+        """Record the timeline of the fits.
+
+        The nodes, the adapter updates, the discovery of the profiles, the
+        writing of the results and a sample of the residual evaluations are
+        recorded. In the pipelined mode, the nodes run by each worker
+        process are shown in a lane of their own.
+
+        Parameters
+        ----------
+        tracer : Tracer or None
+            The tracer. None stops the tracing.
+        trace_file : Path or str, optional
+            The file the trace is appended to after each batch of
+            profiles, to be opened in chrome://tracing or
+            https://ui.perfetto.dev. The spans written are dropped from
+            memory. Default is None, which does not write the trace.
+        residual_every : int, optional
+            One residual evaluation out of `residual_every` is recorded.
+            Default is 100.
+        """
+        self.tracer = tracer
+        self.trace_file = trace_file
+        self.runner.set_tracer(tracer, residual_every=residual_every)
+
+    def set_pipeline(self, n_inflight, rerun_tolerance=None):
+        """Fit several profiles at the same time.
+
+        In the pipelined mode, up to `n_inflight` profiles are fitted in
+        worker processes at the same time. A profile starts from the result
+        of the closest preceding profile that is finished when it is
+        dispatched, or from the initial payload. The results are written
+        in the order of the profiles.
+
+        The profiles are fitted by the runners of the worker processes. The
+        windows watching the payloads are updated when the results are
+        written, but the snapshots, the checkpoint and the result cache are
+        not used. A warning is issued when any of them is set.
+
+        Parameters
+        ----------
+        n_inflight : int
+            The maximum number of profiles fitted at the same time. 1 fits
+            the profiles one after another, each starting from the result of
+            the previous one.
+        rerun_tolerance : float, optional
+            When set, a profile that did not start from the result of its
+            predecessor is fitted again from that result if any of its
+            parameter values deviates from the predecessor's by more than
+            this relative tolerance. Default is None, which never re-fits.
+        """
+        if n_inflight < 1:
+            raise ValueError(
+                f"n_inflight must be a positive integer, got {n_inflight}."
             )
-            self.profiles_finished = self.profiles_known[:ind]
-            result_files = [file for file in self.dump_folder.glob("*.json")]
-            result_to_profile_stem = [
-                re.findall(f"{self.dump_filename}_(.*).json", file.name)[0]
-                for file in result_files
-            ]
-            if Path(start_from).stem not in result_to_profile_stem:
-                raise ValueError(
-                    f"No result file found for start profile {start_from}"
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.n_inflight = n_inflight
+        self.rerun_tolerance = rerun_tolerance
+        self._warn_unused_in_pipeline()
+
+    def _warn_unused_in_pipeline(self):
+        if self.n_inflight == 1:
+            return
+        unused = []
+        if any(
+            this_event["source"] == "adapter"
+            for this_event in self.runner.collect_data_event.values()
+        ):
+            unused.append("the snapshot watches")
+        if self.runner.checkpoint_path is not None:
+            unused.append("the checkpoint")
+        if self.runner.result_cache is not None:
+            unused.append("the result cache")
+        if unused:
+            warnings.warn(
+                f"The pipelined mode does not use {', '.join(unused)}."
+            )
+
+    def _launch_pipelined(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.n_inflight, initializer=_init_worker
+            )
+        profiles = list(self.profiles_running)
+        start_payload = (
+            self.last_payload
+            if self.last_payload is not None
+            else self.initial_payload
+        )
+        # The final payloads of the fitted profiles, by profile index
+        fitted = {}
+        # The completed DAGs waiting for their predecessors to be written
+        completed = {}
+        # Whether the fit started from the result of the predecessor
+        seeded_by_predecessor = {}
+        in_flight = {}
+
+        def submit(index, payload, by_predecessor):
+            seeded_by_predecessor[index] = by_predecessor
+            future = self._executor.submit(
+                _fit_profile,
+                self.template_dag,
+                self._get_inputs(profiles[index]),
+                payload,
+            )
+            in_flight[future] = index
+
+        next_dispatch = 0
+        next_finish = 0
+        while next_finish < len(profiles):
+            while len(in_flight) < self.n_inflight and next_dispatch < len(
+                profiles
+            ):
+                preceding = [i for i in fitted if i < next_dispatch]
+                if preceding:
+                    payload = fitted[max(preceding)]
+                else:
+                    payload = start_payload
+                by_predecessor = next_dispatch == 0 or (
+                    next_dispatch - 1 in fitted
+                )
+                submit(next_dispatch, payload, by_predecessor)
+                next_dispatch += 1
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = in_flight.pop(future)
+                dag = future.result()
+                if self.tracer is not None:
+                    for node_id in dag.topological_order:
+                        self.runner._trace_node(dag, node_id)
+                last_node_id = dag.topological_order[-1]
+                fitted[index] = dag.nodes[last_node_id]["payload"]
+                completed[index] = dag
+            # Write the results in order, re-fitting if necessary.
+            while next_finish in completed:
+                predecessor_payload = (
+                    fitted[next_finish - 1]
+                    if next_finish > 0
+                    else start_payload
                 )
-            result_file = result_files[
-                result_to_profile_stem.index(Path(start_from).stem)
-            ]
-            dag = FitDAG()
-            dag.from_json(result_file)
-            self.last_payload = dag.nodes[list(nx.topological_sort(dag))[-1]][
-                "payload"
-            ]
+                if (
+                    self.rerun_tolerance is not None
+                    and not seeded_by_predecessor[next_finish]
+                    and _max_relative_deviation(
+                        fitted[next_finish], predecessor_payload
+                    )
+                    > self.rerun_tolerance
+                ):
+                    del completed[next_finish]
+                    del fitted[next_finish]
+                    submit(next_finish, predecessor_payload, True)
+                    break
+                dag = completed.pop(next_finish)
+                self.runner.replay_data(dag)
+                self._finish_profile(profiles[next_finish], dag)
+                next_finish += 1
 
     def _launch(self):
+        fitted = bool(self.profiles_running)
+        if self.last_payload is None and fitted:
+            self._restore_last_payload()
+        if self.n_inflight > 1:
+            self._launch_pipelined()
+        else:
+            self._launch_serial()
+        self.profiles_running = []
+        if fitted and self.tracer is not None and self.trace_file is not None:
+            self.tracer.flush(self.trace_file)
+
+    def _launch_serial(self):
         for profile in self.profiles_running:
             if self.last_payload is not None:
                 payload = self.last_payload
             else:
                 payload = self.initial_payload
-            inputs = {
-                "profile_string": profile.read_text(),
-                "structure_string": self.structure_file.read_text(),
-                **self.inputs_kwargs,
-            }
-            dag = self.template_dag.copy(
-                with_payload=False,
-                with_same_id=False,
-                return_type="FitDAG",
-            )
-            self.runner._run_dag(
-                dag, Adapter=PDFAdapter, inputs=inputs, payload=payload
-            )
-            last_node_id = list(nx.topological_sort(dag))[-1]
-            self.last_payload = dag.nodes[last_node_id]["payload"]
-            dag.to_json(
-                self.dump_folder / f"{self.dump_filename}_{profile.stem}.json"
+            inputs = self._get_inputs(profile)
+            dag = self.template_dag.instantiate()
+            # Without a checkpoint, the whole DAG is run.
+            self.runner.resume_dag(
+                dag,
+                Adapter=PDFAdapter,
+                inputs=inputs,
+                payload=payload,
+                adapter=self.adapter,
             )
-            self.profiles_finished.append(profile)
-            print(f"Finsihed {len(self.profiles_finished)+1} fit tasks.")
-        self.profiles_running = []
+            self._finish_profile(profile, dag)
 
     def set_meta_inputs(
         self,
@@ -119,14 +451,33 @@ class PDFFitLauncher:
         qmax,
         remove_vars,
         filename_pattern: str = r"(\d+)K\.gr",
+        watcher_backend: str = "auto",
+        registry_file: Path = None,
+        dump_format: str = "json",
     ):
         self.profile_folder = profile_folder
         self.structure_file = structure_file
         self.initial_payload = initial_payload
         self.dump_folder = dump_folder
         self.dump_filename = dump_filename
+        if dump_format not in ("json", "binary"):
+            raise ValueError(
+                f"Unknown dump format: {dump_format}. "
+                "Please choose one of {'json', 'binary'}."
+            )
+        # "binary" writes the compact format of FitDAG.to_binary.
+        self.dump_format = dump_format
         self.template_dag = template_dag
         self.filename_pattern = filename_pattern
+        # See ProfileWatcher for the backends.
+        self.watcher_backend = watcher_backend
+        if self.profile_watcher is not None:
+            self.profile_watcher.close()
+        self.profile_watcher = None
+        # With a registry file, a restarted launcher skips the profiles
+        # finished before, see ProfileRegistry.
+        self.profiles = ProfileRegistry(registry_file)
+        self.profiles_running = []
         self.inputs_kwargs = {
             "xmin": xmin,
             "xmax": xmax,
@@ -167,8 +518,7 @@ class PDFFitLauncher:
             style = "sparse"
         elif when == "dag end":
             trigger_func = (
-                lambda dag, node_id: node_id
-                == list(nx.topological_sort(dag))[-1]
+                lambda dag, node_id: node_id == dag.topological_order[-1]
             )
             source = "payload"
             update_mode = "append"
@@ -198,6 +548,7 @@ class PDFFitLauncher:
             pname=pname,
             **kwargs,
         )
+        self._warn_unused_in_pipeline()
 
     def launch(self, mode="stream"):
         """Launch the fitting process.
@@ -223,8 +574,8 @@ class PDFFitLauncher:
 
             def _launch_stream():
                 while True:
-                    time.sleep(0.05)  # 20 Hz
-                    self._check_for_new_profiles()
+                    # Wait for new profiles for at most 50 ms.
+                    self._check_for_new_profiles(timeout=0.05)
                     self._launch()
 
             t = threading.Thread(target=_launch_stream)
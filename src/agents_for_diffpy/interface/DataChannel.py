@@ -0,0 +1,111 @@
+import queue
+import threading
+from collections import deque
+
+
+class DataChannel:
+    """Bounded channel carrying the monitored data from FitRunner to its
+    consumers.
+
+    The channel has the `put`, `get`, `get_nowait`, `empty` and `qsize`
+    methods of `queue.Queue`, and a fixed capacity with a policy deciding
+    what happens when a new item arrives while the channel is full.
+
+    Attributes
+    ----------
+    capacity : int or None
+        The maximum number of items held by the channel. None means no
+        limit.
+    policy : {"latest", "drop_oldest", "block"}
+        "latest" keeps only the most recent item, whatever the capacity.
+        "drop_oldest" discards the oldest item to make room for the new one.
+        "block" makes the producer wait until a consumer makes room.
+    dropped : int
+        The number of items discarded so far.
+    """
+
+    policies = ("latest", "drop_oldest", "block")
+
+    def __init__(self, capacity=None, policy="drop_oldest"):
+        if policy not in self.policies:
+            raise ValueError(
+                f"Unknown channel policy: {policy}. "
+                f"Please choose one of {self.policies}."
+            )
+        if policy == "latest":
+            capacity = 1
+        if capacity is not None and capacity < 1:
+            raise ValueError(
+                f"capacity must be a positive integer, got {capacity}."
+            )
+        self.capacity = capacity
+        self.policy = policy
+        self.dropped = 0
+        self._items = deque()
+        self._condition = threading.Condition()
+
+    def _is_full(self):
+        return self.capacity is not None and len(self._items) >= self.capacity
+
+    def put(self, item, timeout=None):
+        """Put an item into the channel.
+
+        Parameters
+        ----------
+        item : object
+            The item to put.
+        timeout : float, optional
+            The maximum time to wait for room with the "block" policy.
+            Default is None, which waits forever.
+
+        Raises
+        ------
+        queue.Full
+            If the "block" policy timed out.
+        """
+        with self._condition:
+            if self._is_full():
+                if self.policy == "block":
+                    if not self._condition.wait_for(
+                        lambda: not self._is_full(), timeout=timeout
+                    ):
+                        raise queue.Full
+                else:
+                    self._items.popleft()
+                    self.dropped += 1
+            self._items.append(item)
+            self._condition.notify_all()
+
+    def get(self, block=True, timeout=None):
+        """Remove and return the oldest item.
+
+        Raises
+        ------
+        queue.Empty
+            If no item is available in time.
+        """
+        with self._condition:
+            if block:
+                self._condition.wait_for(lambda: self._items, timeout=timeout)
+            if not self._items:
+                raise queue.Empty
+            item = self._items.popleft()
+            self._condition.notify_all()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def drain(self):
+        """Remove and return all the items, oldest first."""
+        with self._condition:
+            items = list(self._items)
+            self._items.clear()
+            self._condition.notify_all()
+            return items
+
+    def empty(self):
+        return not self._items
+
+    def qsize(self):
+        return len(self._items)
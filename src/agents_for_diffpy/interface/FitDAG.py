@@ -1,8 +1,18 @@
 import networkx as nx
 import uuid
+import hashlib
+import struct
+import zlib
 from networkx.readwrite.json_graph import node_link_data
 import json
 
+# The binary format written by FitDAG.to_binary: the magic bytes, the
+# length of the header, the JSON header, and the payload of each node as
+# JSON, compressed with zlib or not.
+_BINARY_MAGIC = b"FITDAG\x00\x00"
+_BINARY_VERSION = 2
+_HEADER_LENGTH = struct.Struct("<Q")
+
 
 class FitDAG(nx.DiGraph):
     """A directed acyclic graph (DAG) representing fitting instructions.
@@ -31,6 +41,9 @@ class FitDAG(nx.DiGraph):
         as the starting point for the current node.
         It can also stores other results as irrelevant key-value
         pairs will be ignored by the adapter.
+    metrics: dict
+        The performance of the node when it was run, recorded by FitRunner,
+        e.g. the time spent and the number of residual evaluations.
 
     Edge Attributes
     ---------------
@@ -39,6 +52,9 @@ class FitDAG(nx.DiGraph):
     """
 
     def __init__(self):
+        # The root and leaf nodes, the topological order and the name index,
+        # computed on first access and cleared when the graph changes.
+        self._topology = {}
         super().__init__()
         # Used to template the default node and edge attributes
         self.default_node = {
@@ -48,34 +64,106 @@ class FitDAG(nx.DiGraph):
             "buffer": {},
             "payload": {},
             "action": [],
+            "metrics": {},
         }
         self.default_edge = {
             "description": "",
             "source": None,
             "target": None,
         }
-        # Metadata for the current running state of the DAG.
-        # Used by FitRunner.
-        # Can be ignored if the DAG is only used as a static data container.
-        self.name_to_id = {}
+
+    def _cached(self, key, compute):
+        if key not in self._topology:
+            self._topology[key] = compute()
+        return self._topology[key]
+
+    def _invalidate_topology(self):
+        self._topology = {}
 
     @property
     def root_nodes(self):
-        return [
-            node_id for node_id in self.nodes() if self.in_degree(node_id) == 0
-        ]
+        return list(
+            self._cached(
+                "root_nodes",
+                lambda: [
+                    node_id
+                    for node_id in self.nodes()
+                    if self.in_degree(node_id) == 0
+                ],
+            )
+        )
 
     @property
     def leaf_nodes(self):
-        return [
-            node_id
-            for node_id in self.nodes()
-            if self.out_degree(node_id) == 0
-        ]
+        return list(
+            self._cached(
+                "leaf_nodes",
+                lambda: [
+                    node_id
+                    for node_id in self.nodes()
+                    if self.out_degree(node_id) == 0
+                ],
+            )
+        )
+
+    @property
+    def topological_order(self):
+        """The node IDs in topological order, as a tuple."""
+        return self._cached(
+            "topological_order", lambda: tuple(nx.topological_sort(self))
+        )
+
+    @property
+    def name_to_id(self):
+        """The ID of the node with each name. Used by FitRunner."""
+        return self._cached(
+            "name_to_id",
+            lambda: {
+                node_content["name"]: node_id
+                for node_id, node_content in self.nodes(data=True)
+            },
+        )
 
     def _update_name_to_id(self):
-        for node_id, node_content in self.nodes(data=True):
-            self.name_to_id[node_content["name"]] = node_id
+        # The node names may have been changed in place.
+        self._topology.pop("name_to_id", None)
+
+    # The cached topology is cleared by every method changing the graph.
+    def add_node(self, node_for_adding, **attr):
+        super().add_node(node_for_adding, **attr)
+        self._invalidate_topology()
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        super().add_nodes_from(nodes_for_adding, **attr)
+        self._invalidate_topology()
+
+    def remove_node(self, n):
+        super().remove_node(n)
+        self._invalidate_topology()
+
+    def remove_nodes_from(self, nodes):
+        super().remove_nodes_from(nodes)
+        self._invalidate_topology()
+
+    def add_edge(self, u_of_edge, v_of_edge, **attr):
+        super().add_edge(u_of_edge, v_of_edge, **attr)
+        self._invalidate_topology()
+
+    def add_edges_from(self, ebunch_to_add, **attr):
+        super().add_edges_from(ebunch_to_add, **attr)
+        self._invalidate_topology()
+
+    def remove_edge(self, u, v):
+        super().remove_edge(u, v)
+        self._invalidate_topology()
+
+    def remove_edges_from(self, ebunch):
+        super().remove_edges_from(ebunch)
+        self._invalidate_topology()
+
+    def clear_edges(self):
+        super().clear_edges()
+        self._invalidate_topology()
 
     def furnish_node_dict(self, node_dict):
         """Make the arbitrary node dictionary conform to the default node
@@ -154,6 +242,7 @@ class FitDAG(nx.DiGraph):
         for edge in data["edges"]:
             edge = self.furnish_edge_dict(edge)
             self.add_edge(edge.pop("source"), edge.pop("target"), **edge)
+        self.graph.update(data.get("graph", {}))
         self._update_name_to_id()
 
     def from_str(self, dag_str):
@@ -189,7 +278,15 @@ class FitDAG(nx.DiGraph):
     def copy(
         self, with_payload=False, with_same_id=True, return_type="networkx"
     ):
-        """Create a clean copy of the DAG."""
+        """Create a clean copy of the DAG.
+
+        The DAG itself is left untouched. The copy gets new attribute
+        dictionaries, with the buffer set to None and, unless
+        `with_payload` is True, the payload set to None and the metrics
+        emptied. The other attribute
+        values, e.g. the action lists, are shared with the DAG and must not
+        be modified in place.
+        """
         if return_type == "networkx":
             graph = nx.DiGraph()
         elif return_type == "FitDAG":
@@ -198,9 +295,10 @@ class FitDAG(nx.DiGraph):
             raise KeyError(f"Unidentified type: {return_type}")
         id_maps = {}
         for node_id, node_content in self.nodes(data=True):
-            node_content["buffer"] = None
+            node_content = {**node_content, "buffer": None}
             if not with_payload:
                 node_content["payload"] = None
+                node_content["metrics"] = {}
             if not with_same_id:
                 new_node_id = str(uuid.uuid4())
                 the_node_id = new_node_id
@@ -211,12 +309,80 @@ class FitDAG(nx.DiGraph):
 
         for u, v, edge_content in self.edges(data=True):
             graph.add_edge(id_maps[u], id_maps[v], **edge_content)
+        graph.graph.update(self.graph)
 
         if return_type == "FitDAG":
             graph._update_name_to_id()
 
         return graph
 
+    def node_signatures(self, seed=""):
+        """Get a signature of the computation leading to each node.
+
+        The signature of a node hashes its action and the signatures of its
+        parents, and the signature of a root node hashes its action and
+        `seed`. Two nodes have the same signature only if the same actions
+        were executed in the same order to reach them, so a node keeps its
+        signature when the DAG is edited elsewhere than upstream of it.
+
+        Parameters
+        ----------
+        seed : str, optional
+            Identifies what the root nodes start from, e.g. a hash of the
+            inputs and of the initial payload. Default is "".
+
+        Returns
+        -------
+        dict
+            The signatures, keyed by node ID.
+        """
+        signatures = {}
+        for node_id in nx.topological_sort(self):
+            parent_signatures = sorted(
+                signatures[parent_id]
+                for parent_id in self.predecessors(node_id)
+            )
+            digest = hashlib.sha256()
+            digest.update(json.dumps(self.nodes[node_id]["action"]).encode())
+            for parent_signature in parent_signatures or [seed]:
+                digest.update(parent_signature.encode())
+            signatures[node_id] = digest.hexdigest()
+        return signatures
+
+    def instantiate(self):
+        """Create a DAG to run from this template DAG.
+
+        This is `copy(with_payload=False, with_same_id=False,
+        return_type="FitDAG")`, with the nodes and the edges added in bulk.
+        The template is left untouched and shares its action lists with the
+        new DAG.
+
+        Returns
+        -------
+        FitDAG
+            The new DAG, with new node IDs and empty payloads and buffers.
+        """
+        id_maps = {node_id: str(uuid.uuid4()) for node_id in self.nodes}
+        graph = FitDAG()
+        graph.add_nodes_from(
+            (
+                id_maps[node_id],
+                {
+                    **node_content,
+                    "buffer": None,
+                    "payload": None,
+                    "metrics": {},
+                },
+            )
+            for node_id, node_content in self.nodes(data=True)
+        )
+        graph.add_edges_from(
+            (id_maps[u], id_maps[v], edge_content)
+            for u, v, edge_content in self.edges(data=True)
+        )
+        graph.graph.update(self.graph)
+        return graph
+
     def to_json(self, filename="graph.json"):
         graph = self.copy(with_payload=True, with_same_id=True)
         data = node_link_data(
@@ -235,6 +401,190 @@ class FitDAG(nx.DiGraph):
             graph_dict = json.load(f)
         self.from_dict(graph_dict)
 
+    def to_binary(self, filename="graph.fitdag", compress=True):
+        """Save the DAG in a compact binary file.
+
+        The topology and the node attributes other than the payloads are
+        written in a JSON header, followed by the payload of each node. The
+        header records where each payload is, so `read_binary_topology` and
+        `read_binary_payload` can read the topology or a single payload
+        without decoding the rest of the file.
+
+        Parameters
+        ----------
+        filename : Path or str, optional
+            The file to write. Default is "graph.fitdag".
+        compress : bool, optional
+            Whether the payloads are compressed with zlib. Default is True.
+        """
+        blobs = []
+        # The location of the payload of each node, in the order of the
+        # nodes, as the node IDs are not always strings, unlike JSON keys.
+        offsets = []
+        offset = 0
+        nodes = []
+        for node_id, node_content in self.nodes(data=True):
+            nodes.append(
+                [
+                    node_id,
+                    {
+                        key: value
+                        for key, value in node_content.items()
+                        if key not in ("buffer", "payload")
+                    },
+                ]
+            )
+            if node_content["payload"] is None:
+                offsets.append(None)
+                continue
+            blob = json.dumps(
+                node_content["payload"], separators=(",", ":"), default=float
+            ).encode()
+            if compress:
+                blob = zlib.compress(blob)
+            offsets.append([offset, len(blob)])
+            offset += len(blob)
+            blobs.append(blob)
+        header = {
+            "version": _BINARY_VERSION,
+            "compression": "zlib" if compress else None,
+            "graph": self.graph,
+            "nodes": nodes,
+            "edges": [
+                [u, v, edge_content]
+                for u, v, edge_content in self.edges(data=True)
+            ],
+            "last_node": (
+                self.topological_order[-1] if len(self) > 0 else None
+            ),
+            "payloads": offsets,
+        }
+        header = json.dumps(
+            header, separators=(",", ":"), default=str
+        ).encode()
+        with open(filename, "wb") as f:
+            f.write(_BINARY_MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header)))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+
+    @staticmethod
+    def _read_binary_header(f):
+        """Read the header, and leave the file at the first payload."""
+        if f.read(len(_BINARY_MAGIC)) != _BINARY_MAGIC:
+            raise ValueError(f"{f.name} is not a FitDAG binary file.")
+        (length,) = _HEADER_LENGTH.unpack(f.read(_HEADER_LENGTH.size))
+        header = json.loads(f.read(length))
+        if header["version"] > _BINARY_VERSION:
+            raise ValueError(
+                f"{f.name} was written in version {header['version']} of "
+                f"the FitDAG binary format, newer than the supported version "
+                f"{_BINARY_VERSION}."
+            )
+        if header["version"] < 2:
+            # The payloads were keyed by the node IDs as strings.
+            header["payloads"] = [
+                header["payloads"].get(str(node_id))
+                for node_id, _ in header["nodes"]
+            ]
+        return header
+
+    @staticmethod
+    def _read_binary_blob(f, header, start, location):
+        offset, length = location
+        f.seek(start + offset)
+        blob = f.read(length)
+        if header["compression"] == "zlib":
+            blob = zlib.decompress(blob)
+        return json.loads(blob)
+
+    def from_binary(self, filename, with_payload=True):
+        """Load the DAG from a file written by `to_binary`.
+
+        Parameters
+        ----------
+        filename : Path or str
+            The file to read.
+        with_payload : bool, optional
+            Whether to decode the payloads. Default is True. When False, the
+            payloads are set to None and only the header is read.
+        """
+        with open(filename, "rb") as f:
+            header = self._read_binary_header(f)
+            start = f.tell()
+            payloads = [
+                (
+                    self._read_binary_blob(f, header, start, location)
+                    if with_payload and location is not None
+                    else None
+                )
+                for location in header["payloads"]
+            ]
+        self.clear()
+        self.add_nodes_from(
+            (
+                node_id,
+                {**node_content, "buffer": None, "payload": payload},
+            )
+            for (node_id, node_content), payload in zip(
+                header["nodes"], payloads
+            )
+        )
+        self.add_edges_from(
+            (u, v, edge_content) for u, v, edge_content in header["edges"]
+        )
+        self.graph.update(header["graph"])
+
+    @staticmethod
+    def read_binary_topology(filename):
+        """Load the DAG from a file written by `to_binary`, without the
+        payloads.
+
+        Returns
+        -------
+        FitDAG
+            The DAG, with the payloads set to None.
+        """
+        dag = FitDAG()
+        dag.from_binary(filename, with_payload=False)
+        return dag
+
+    @staticmethod
+    def read_binary_payload(filename, node_id=None):
+        """Read a single payload from a file written by `to_binary`.
+
+        Only the header and the requested payload are decoded.
+
+        Parameters
+        ----------
+        filename : Path or str
+            The file to read.
+        node_id : hashable, optional
+            The ID of the node. Default is None, which reads the payload of
+            the last node in topological order, i.e. the final result.
+
+        Returns
+        -------
+        dict or None
+            The payload, or None if the node has no payload.
+        """
+        with open(filename, "rb") as f:
+            header = FitDAG._read_binary_header(f)
+            start = f.tell()
+            if node_id is None:
+                node_id = header["last_node"]
+            for (this_id, _), location in zip(
+                header["nodes"], header["payloads"]
+            ):
+                if this_id == node_id:
+                    break
+            else:
+                return None
+            if location is None:
+                return None
+            return FitDAG._read_binary_blob(f, header, start, location)
+
     def render(self, filename="graph.html"):
         """Show the DAG structure."""
         from pyvis.network import Network
@@ -257,4 +607,4 @@ class FitDAG(nx.DiGraph):
 
     def clear(self):
         super().clear()
-        self.name_to_id = {}
+        self._invalidate_topology()
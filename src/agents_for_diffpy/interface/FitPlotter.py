@@ -1,11 +1,44 @@
 from PyQt5 import QtWidgets, QtCore
 import pyqtgraph as pg
+import numpy
 import sys
 from agents_for_diffpy.interface import FitRunner
+from agents_for_diffpy.interface.RingBuffer import RingBuffer
+
+
+def _minmax_decimate(y, nbins):
+    """Reduce a dense curve to the minimum and maximum of each bin.
+
+    Parameters
+    ----------
+    y : numpy.ndarray
+        The curve to reduce.
+    nbins : int
+        The number of bins, usually the width of the plot in pixels.
+
+    Returns
+    -------
+    x : numpy.ndarray
+        The indices of the reduced points in the original curve.
+    y : numpy.ndarray
+        The reduced curve, alternating the minimum and the maximum of each
+        bin. The curve is returned as is if it has no more than two points
+        per bin. The NaNs are ignored, a bin holding only NaNs gives NaNs.
+    """
+    n = len(y)
+    if nbins < 1 or n <= 2 * nbins:
+        return numpy.arange(n), y
+    starts = numpy.linspace(0, n, nbins + 1).astype(int)[:-1]
+    ends = numpy.append(starts[1:], n)
+    reduced = numpy.empty(2 * nbins, dtype=float)
+    reduced[0::2] = numpy.fmin.reduceat(y, starts)
+    reduced[1::2] = numpy.fmax.reduceat(y, starts)
+    x = numpy.repeat((starts + ends - 1) / 2, 2)
+    return x, reduced
 
 
 class FitPlotter:
-    def __init__(self):
+    def __init__(self, history=10000):
         super().__init__()
         self.app = QtWidgets.QApplication(sys.argv)
         self.win = QtWidgets.QWidget()
@@ -13,6 +46,9 @@ class FitPlotter:
         self.layout = QtWidgets.QVBoxLayout()
         self.win.setLayout(self.layout)
         self.win.runner = None
+        # Number of points kept by the "append" windows
+        self.history = history
+        self.plots = []
         self.curves = []
 
     def connect_to_runner(self, runner: FitRunner):
@@ -33,25 +69,54 @@ class FitPlotter:
                 curve = plot.plot(
                     pen=pg.mkPen(pg.intColor(i), width=2),
                 )
+            self.plots.append(plot)
             self.curves.append(curve)
         # Timer
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.update_plot)
         self.timer.start(50)  # 20Hz
-        self.buffers = [[] for _ in range(len(self.curves))]
+        # "append" windows keep their points in a ring buffer, "replace"
+        # windows only the latest curve.
+        self.buffers = [
+            (
+                RingBuffer(self.history)
+                if data_pack["update_mode"] == "append"
+                else None
+            )
+            for data_pack in runner.data_for_plot.values()
+        ]
+        # The plot width used for the last drawing of each curve, None if
+        # the curve has new data to draw.
+        self.drawn_widths = [None for _ in range(len(self.curves))]
 
     def update_plot(self):
         for i, (window_id, data_pack) in enumerate(
             self.runner.data_for_plot.items()
         ):
-            if not data_pack["ydata"].empty():
-                new_data = data_pack["ydata"].get()
+            # Take all the pending items at once.
+            new_data = data_pack["ydata"].drain()
+            if new_data:
                 if data_pack["update_mode"] == "append":
-                    self.buffers[i].append(new_data)
-                    plot_data = self.buffers[i]
+                    self.buffers[i].extend(new_data)
                 elif data_pack["update_mode"] == "replace":
-                    plot_data = new_data
+                    # Keep a copy, the producer may reuse its array.
+                    self.buffers[i] = numpy.array(new_data[-1], dtype=float)
+                self.drawn_widths[i] = None
+            if self.buffers[i] is None:
+                continue
+            width = self.plots[i].width()
+            if self.drawn_widths[i] == width:
+                continue
+            if data_pack["update_mode"] == "append":
+                plot_data = self.buffers[i].to_array()
+            else:
+                plot_data = self.buffers[i]
+            if data_pack["style"] == "dense":
+                x, y = _minmax_decimate(plot_data, width)
+                self.curves[i].setData(x, y)
+            else:
                 self.curves[i].setData(plot_data)
+            self.drawn_widths[i] = width
 
     def on(self):
         self.win.show()
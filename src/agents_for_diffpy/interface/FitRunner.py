@@ -1,17 +1,105 @@
 import uuid
+import hashlib
+import json
+import os
+import tempfile
 import warnings
 import threading
 import time
+import weakref
 from collections import OrderedDict, defaultdict
-import queue
+import asyncio
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import networkx as nx
+import numpy
 from agents_for_diffpy.interface import FitDAG
+from agents_for_diffpy.interface.PoolRegistry import pool_registry
+from agents_for_diffpy.interface.DataChannel import DataChannel
+
+
+def _init_worker():
+    # The workers already run in parallel, the PDF calculation inside each
+    # of them does not need another pool.
+    pool_registry.configure(ncpu=1)
+
+
+def _hash_inputs(inputs, payload):
+    """Identify the inputs and the starting payload of a DAG."""
+    text = json.dumps(
+        {"inputs": inputs, "payload": payload}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _get_solver_metrics(result):
+    """Get the statistics of the refinement from the result returned by
+    an action, e.g. a `scipy.optimize.OptimizeResult`."""
+    metrics = {}
+    for key, convert in (
+        ("nfev", int),
+        ("njev", int),
+        ("cost", float),
+        ("status", int),
+    ):
+        value = getattr(result, key, None)
+        metrics[key] = convert(value) if value is not None else None
+    return metrics
+
+
+def _run_action(adapter, payload, action):
+    """Run the action of a node on its adapter and measure it.
+
+    Returns
+    -------
+    payload : dict
+        The payload of the adapter after the action.
+    metrics : dict
+        The wall time, the CPU time of the calling thread, the time spent in
+        `apply_payload` and in the refinement, and the statistics of the
+        refinement. "nfev" and "njev" are counted by the solver, "neval"
+        counts every residual evaluation of adapters having a
+        `residual_count`, including the finite differences and the
+        evaluations of a Jacobian provider. "start_time", from `time.time`,
+        and "pid" tell when and in which process the node was run.
+    """
+    start_time = time.time()
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    count = getattr(adapter, "residual_count", None)
+    adapter.apply_payload(payload)
+    applied = time.perf_counter()
+    result = adapter.action_func_factory(action)()
+    refined = time.perf_counter()
+    payload = adapter.get_payload()
+    metrics = {
+        "source": "run",
+        "start_time": start_time,
+        "pid": os.getpid(),
+        "wall_time": time.perf_counter() - start,
+        "cpu_time": time.thread_time() - cpu_start,
+        "apply_payload_time": applied - start,
+        "least_squares_time": refined - applied,
+        **_get_solver_metrics(result),
+        "neval": (
+            adapter.residual_count - count if count is not None else None
+        ),
+    }
+    return payload, metrics
+
+
+def _run_node_in_worker(adapter, payload, action):
+    """Run the action of a node on a copy of its adapter in a worker
+    process, and return the resulting payload and metrics."""
+    return _run_action(adapter, payload, action)
 
 
 class FitRunner:
     def __init__(self):
         # Interact with FitPlotter
         # {window_id: {
-        #   "ydata": queue.Queue(),
+        #   "ydata": DataChannel(),
         #   "title": str,
         #   "update_mode": str,
         #    "style": str}}
@@ -22,8 +110,379 @@ class FitRunner:
         #   "pname": str,
         #   "source": str}}
         self.collect_data_event = OrderedDict({})
-        # Temporary storage for running information
+        # Notify the consumers of data_for_plot, see subscribe
+        self.data_condition = threading.Condition()
+        self.data_version = 0
+        self._subscribers = OrderedDict({})
+        # Temporary storage for running information: the status of the
+        # nodes, keyed by node ID
         self.running_info = {}
+        # The state of each DAG being run, see _start_run. Several DAGs can
+        # be run at the same time by run_dag_async.
+        self._runs = weakref.WeakKeyDictionary()
+        # Maximum number of sibling nodes run at the same time
+        self.max_workers = 1
+        self._executor = None
+        # Completion events of the nodes run by run_dag_async, by event
+        # loop. The events of a DAG are dropped when its run finishes.
+        self.node_events = weakref.WeakKeyDictionary()
+        # The node status is updated from the executor threads.
+        self._status_lock = threading.Lock()
+        # See set_checkpoint
+        self.checkpoint_path = None
+        # See set_result_cache
+        self.result_cache = None
+        # See set_tracer
+        self.tracer = None
+        self.residual_trace_every = 100
+
+    def set_concurrency(self, max_workers):
+        """Set the number of nodes that can run at the same time.
+
+        Nodes that become ready in the same iteration, e.g. the alternative
+        branches following a common node, are independent of each other.
+        When `max_workers` is larger than 1, they are run in worker processes
+        and their payloads are sent back to the DAG. Each worker gets a copy
+        of the node adapter, so the adapter must be picklable and provide
+        `free_parameters(action)` to replay the action state on the adapter
+        kept in this process.
+
+        The adapter is pickled for every node sent to a worker, and
+        unpickling it may rebuild it from its inputs. PDFAdapter builds its
+        recipe once per worker and per inputs, and copies it afterwards.
+        When the "adapter" data source of `watch` is used, the adapters
+        having a `refresh_snapshots` method evaluate their snapshots once
+        more in this process, at the payload sent back by the worker.
+
+        Parameters
+        ----------
+        max_workers : int
+            The maximum number of worker processes. 1 runs every node in this
+            process, one after another.
+        """
+        if max_workers < 1:
+            raise ValueError(
+                f"max_workers must be a positive integer, got {max_workers}."
+            )
+        if max_workers != self.max_workers:
+            self.shutdown()
+        self.max_workers = max_workers
+
+    def set_checkpoint(self, path):
+        """Save the completed nodes of the running DAG to a file.
+
+        The file is rewritten each time a node is completed. It holds the
+        payload and the name of each completed node, and a hash of the
+        inputs and of the starting payload of the DAG. The file is written
+        to a temporary file first and then renamed, so an interrupted write
+        leaves the previous checkpoint intact. Use `resume_dag` to run a DAG
+        again without the nodes completed before the interruption.
+
+        Only one DAG can be checkpointed at a time.
+
+        Parameters
+        ----------
+        path : Path or str or None
+            The checkpoint file. None stops the checkpointing.
+        """
+        self.checkpoint_path = Path(path) if path is not None else None
+
+    def _write_checkpoint(self, dag):
+        nodes = {
+            node_id: {
+                "name": dag.nodes[node_id]["name"],
+                "payload": dag.nodes[node_id]["payload"],
+            }
+            for node_id in dag.nodes
+            if self.is_marked(node_id, "completed")
+        }
+        checkpoint = {
+            "inputs_hash": dag.graph.get("inputs_hash"),
+            "nodes": nodes,
+        }
+        # Each write has its own temporary file, as DAGs run at the same
+        # time may write the checkpoint at the same time.
+        f = tempfile.NamedTemporaryFile(
+            "w",
+            dir=self.checkpoint_path.parent,
+            prefix=self.checkpoint_path.name + ".",
+            suffix=".tmp",
+            delete=False,
+        )
+        try:
+            with f:
+                json.dump(checkpoint, f, default=float)
+            os.replace(f.name, self.checkpoint_path)
+        except BaseException:
+            os.remove(f.name)
+            raise
+
+    def load_checkpoint(self, dag, inputs, payload, path=None):
+        """Get the payloads of the nodes completed in a checkpoint.
+
+        The saved nodes are matched to the nodes of `dag` by ID, or by name
+        when the name is unique in both. The checkpoint is ignored if it
+        was written for other inputs or another starting payload.
+
+        Parameters
+        ----------
+        dag : FitDAG
+            The DAG to resume.
+        inputs : dict
+            The inputs of the DAG.
+        payload : dict
+            The payload passed to the root node.
+        path : Path or str, optional
+            The checkpoint file. Default is None, which uses the one set by
+            `set_checkpoint`.
+
+        Returns
+        -------
+        dict
+            The saved payloads, keyed by the IDs of the nodes of `dag`.
+        """
+        path = Path(path) if path is not None else self.checkpoint_path
+        if path is None or not path.exists():
+            return {}
+        with open(path, "r") as f:
+            checkpoint = json.load(f)
+        if checkpoint["inputs_hash"] != _hash_inputs(inputs, payload):
+            return {}
+        saved_nodes = checkpoint["nodes"]
+        saved_names = [saved["name"] for saved in saved_nodes.values()]
+        dag_names = [dag.nodes[node_id]["name"] for node_id in dag.nodes]
+        completed = {}
+        for node_id in dag.nodes:
+            name = dag.nodes[node_id]["name"]
+            if node_id in saved_nodes:
+                completed[node_id] = saved_nodes[node_id]["payload"]
+            elif saved_names.count(name) == 1 and dag_names.count(name) == 1:
+                saved_id = list(saved_nodes)[saved_names.index(name)]
+                completed[node_id] = saved_nodes[saved_id]["payload"]
+        return completed
+
+    def resume_dag(
+        self,
+        dag: FitDAG,
+        Adapter: type,
+        inputs: dict,
+        payload: dict,
+        adapter=None,
+        path=None,
+    ):
+        """Run the DAG, skipping the nodes completed in a checkpoint.
+
+        Parameters
+        ----------
+        dag, Adapter, inputs, payload, adapter
+            See `_run_dag`.
+        path : Path or str, optional
+            The checkpoint file. Default is None, which uses the one set by
+            `set_checkpoint`. Without a checkpoint, the whole DAG is run.
+
+        Returns
+        -------
+        FitDAG
+            The same DAG with the payload of each node filled in.
+        """
+        completed = self.load_checkpoint(dag, inputs, payload, path=path)
+        return self._run_dag(
+            dag,
+            Adapter=Adapter,
+            inputs=inputs,
+            payload=payload,
+            adapter=adapter,
+            completed=completed,
+        )
+
+    def set_result_cache(self, result_cache):
+        """Reuse the payloads of the nodes computed before.
+
+        Before a node is run, its payload is looked up in the cache by the
+        inputs of the adapter, the payload passed to the node, its action,
+        the actions of its ancestors, which decide the parameters already
+        freed, and the solver settings of the adapter. On a hit, the node is
+        completed with the cached payload without being run.
+
+        Parameters
+        ----------
+        result_cache : ResultCache or None
+            The cache. None stops the caching.
+        """
+        self.result_cache = result_cache
+
+    def _start_run(self, dag, inputs, payload):
+        """Record the state of a run with its DAG, not in the runner, so
+        several DAGs can be run at the same time."""
+        # Used by rerun_dag to compare the DAG with an edited one, and by
+        # the checkpoint.
+        dag.graph["inputs_hash"] = _hash_inputs(inputs, payload)
+        # The inputs are shared by all the adapters of the DAG, and hashed
+        # once, on the first lookup in the result cache.
+        self._runs[dag] = {"inputs": inputs, "adapter_inputs_hash": None}
+
+    def _hash_adapter_inputs(self, dag, adapter):
+        run = self._runs.get(dag)
+        if run is None or run["inputs"] is not adapter.inputs:
+            return _hash_inputs(adapter.inputs, None)
+        if run["adapter_inputs_hash"] is None:
+            run["adapter_inputs_hash"] = _hash_inputs(adapter.inputs, None)
+        return run["adapter_inputs_hash"]
+
+    def _result_key(self, dag, node_id):
+        node = dag.nodes[node_id]
+        # The key is made once, on the lookup, and kept for the store.
+        if "cache_key" in node["buffer"]:
+            return node["buffer"]["cache_key"]
+        adapter = node["buffer"]["adapter"]
+        freed = sorted(
+            {
+                name
+                for ancestor_id in nx.ancestors(dag, node_id)
+                for name in dag.nodes[ancestor_id]["action"]
+            }
+        )
+        key = self.result_cache.make_key(
+            inputs=self._hash_adapter_inputs(dag, adapter),
+            payload=node["buffer"]["payload"],
+            action=node["action"],
+            freed=freed,
+            solver=getattr(adapter, "jacobian_settings", None),
+        )
+        node["buffer"]["cache_key"] = key
+        return key
+
+    def _get_cached_result(self, dag, node_id):
+        if self.result_cache is None:
+            return None
+        return self.result_cache.get(self._result_key(dag, node_id))
+
+    def _cache_result(self, dag, node_id, payload):
+        if self.result_cache is not None:
+            self.result_cache.put(self._result_key(dag, node_id), payload)
+
+    def rerun_dag(
+        self,
+        dag: FitDAG,
+        previous_dag: FitDAG,
+        Adapter: type,
+        inputs: dict,
+        payload: dict,
+        adapter=None,
+    ):
+        """Run an edited DAG, reusing the payloads of a previous run.
+
+        A node is reused when the same actions lead to it in both DAGs, see
+        `FitDAG.node_signatures`, and it was completed in the previous DAG.
+        Only the nodes downstream of an edit, e.g. an appended node or a
+        node whose action changed, and the nodes the previous run did not
+        reach are run. Nothing is reused if the previous DAG was run with
+        other inputs or another initial payload.
+
+        Parameters
+        ----------
+        dag : FitDAG
+            The edited DAG to run.
+        previous_dag : FitDAG
+            A DAG run by `_run_dag`, possibly interrupted, or saved with
+            `to_json` and loaded back.
+        Adapter, inputs, payload, adapter
+            See `_run_dag`.
+
+        Returns
+        -------
+        FitDAG
+            The same DAG with the payload of each node filled in.
+        """
+        inputs_hash = _hash_inputs(inputs, payload)
+        completed = {}
+        if previous_dag.graph.get("inputs_hash") == inputs_hash:
+            previous_ids = {
+                signature: node_id
+                for node_id, signature in previous_dag.node_signatures(
+                    inputs_hash
+                ).items()
+            }
+            for node_id, signature in dag.node_signatures(inputs_hash).items():
+                if signature not in previous_ids:
+                    continue
+                previous_node = previous_dag.nodes[previous_ids[signature]]
+                # The nodes that never ran keep the empty default payload.
+                if previous_node.get("metrics") or previous_node["payload"]:
+                    completed[node_id] = previous_node["payload"]
+        return self._run_dag(
+            dag,
+            Adapter=Adapter,
+            inputs=inputs,
+            payload=payload,
+            adapter=adapter,
+            completed=completed,
+        )
+
+    def set_tracer(self, tracer, residual_every=100):
+        """Record the timeline of the runs.
+
+        The loading of the inputs, the copies of the adapter, each node and
+        each DAG are recorded as spans. The adapters having a `set_tracer`
+        method also record one residual evaluation out of `residual_every`.
+        Use `Tracer.write` to save the trace.
+
+        Parameters
+        ----------
+        tracer : Tracer or None
+            The tracer. None stops the tracing.
+        residual_every : int, optional
+            The sampling period of the residual evaluations. Default is 100.
+        """
+        self.tracer = tracer
+        self.residual_trace_every = residual_every
+
+    def _trace(self, name, **args):
+        if self.tracer is None:
+            return contextlib.nullcontext()
+        return self.tracer.span(name, **args)
+
+    def _trace_node(self, dag, node_id):
+        """Record the span of a completed node from its metrics."""
+        node = dag.nodes[node_id]
+        metrics = node["metrics"]
+        pid = metrics.get("pid", os.getpid())
+        # The worker processes are shown with one lane each.
+        tid = None if pid == os.getpid() else pid
+        # The span covers the run of the node only. The synchronization of
+        # a worker node and the data collection, counted in the wall time,
+        # happen later in the parent process.
+        run_time = (
+            metrics["wall_time"]
+            - metrics.get("sync_time", 0.0)
+            - metrics.get("collect_time", 0.0)
+        )
+        self.tracer.add_span(
+            node["name"],
+            metrics["start_time"],
+            metrics["start_time"] + run_time,
+            category="node",
+            args={
+                "id": node_id,
+                "source": metrics["source"],
+                "nfev": metrics.get("nfev"),
+            },
+            pid=pid,
+            tid=tid,
+        )
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker
+            )
+        return self._executor
+
+    def shutdown(self):
+        """Shut down the worker processes used to run the nodes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
 
     def watch(
         self,
@@ -34,6 +493,8 @@ class FitRunner:
         title=None,
         style="sparse",
         window_id=None,
+        capacity=None,
+        policy=None,
     ):
         """Set the ploting variables.
 
@@ -80,6 +541,14 @@ class FitRunner:
         window_id : str, optional
             The ID of the plot window. If not provided,
             a new UUID will be generated.
+        capacity : int, optional
+            The maximum number of items held for the window, see DataChannel.
+            Default is None, which holds 1 item in "replace" mode and 1024
+            items in "append" mode.
+        policy : {"latest", "drop_oldest", "block"}, optional
+            What to do with a new item when the window is full, see
+            DataChannel. Default is None, which keeps only the latest item in
+            "replace" mode and drops the oldest item in "append" mode.
 
         Returns
         -------
@@ -90,9 +559,13 @@ class FitRunner:
             title = pname
         if not window_id:
             window_id = str(uuid.uuid4())
+        if policy is None:
+            policy = "latest" if update_mode == "replace" else "drop_oldest"
+        if capacity is None and policy != "latest":
+            capacity = 1024
         if window_id not in self.data_for_plot:
             self.data_for_plot[window_id] = {
-                "ydata": queue.Queue(),
+                "ydata": DataChannel(capacity=capacity, policy=policy),
                 "title": title,
                 "update_mode": update_mode,
                 "style": style,
@@ -109,9 +582,32 @@ class FitRunner:
 
     def _collect_data_realtime(self, dag, node_id):
         assert self.is_marked(node_id, "completed")  # sanity check
+        self._collect_data(dag, node_id)
+
+    def replay_data(self, dag):
+        """Collect the data of a DAG completed by another runner, e.g. in a
+        worker process, as if its nodes were completed by this runner.
+
+        Only the windows watching the "payload" source are updated, as the
+        adapters of the nodes are not available.
+
+        Parameters
+        ----------
+        dag : FitDAG
+            The completed DAG.
+        """
+        for node_id in dag.topological_order:
+            self._collect_data(dag, node_id, sources=("payload",))
+
+    def _collect_data(self, dag, node_id, sources=("payload", "adapter")):
         if not self.collect_data_event:
             return
+        collected = False
         for window_id, this_event in self.collect_data_event.items():
+            if this_event["source"] in ("payload", "adapter") and (
+                this_event["source"] not in sources
+            ):
+                continue
             if not this_event["trigger_func"](dag, node_id):
                 continue
             pname = this_event["pname"]
@@ -121,6 +617,11 @@ class FitRunner:
                 ydata = dag.nodes[node_id]["buffer"]["adapter"].snapshots.get(
                     pname, None
                 )
+                # The snapshot policy may not have captured any evaluation.
+                if ydata is None:
+                    continue
+                # The snapshots are views of the adapter's ring buffers.
+                ydata = numpy.array(ydata)
             else:
                 raise TypeError(
                     f"Not supported data source {this_event['source']}"
@@ -129,7 +630,68 @@ class FitRunner:
                 raise KeyError(f"{pname} not found in {this_event['source']}")
             # Store ydata
             self.data_for_plot[window_id]["ydata"].put(ydata)
-        time.sleep(0.05)  # 20 Hz
+            for callback in list(self._subscribers.values()):
+                callback(window_id, ydata)
+            collected = True
+        if collected:
+            with self.data_condition:
+                self.data_version += 1
+                self.data_condition.notify_all()
+
+    def subscribe(self, callback):
+        """Call a function whenever new data is stored in data_for_plot.
+
+        The callback is called in the thread running the fit, right after
+        the data is stored, as ``callback(window_id, ydata)``. It should
+        return quickly, e.g. by handing the data over to the consumer's own
+        thread or event loop.
+
+        Parameters
+        ----------
+        callback : callable
+            The function taking (window_id, ydata).
+
+        Returns
+        -------
+        str
+            The subscription ID, used by `unsubscribe`.
+        """
+        subscription_id = str(uuid.uuid4())
+        self._subscribers[subscription_id] = callback
+        return subscription_id
+
+    def unsubscribe(self, subscription_id):
+        """Stop calling the function of a subscription."""
+        self._subscribers.pop(subscription_id, None)
+
+    def wait_for_data(self, last_version=None, timeout=None):
+        """Wait until new data is stored in data_for_plot.
+
+        Consumers polling data_for_plot can use this to sleep until there is
+        something to consume, and pace themselves as they like.
+
+        Parameters
+        ----------
+        last_version : int, optional
+            The data version returned by the previous call. Default is None,
+            which waits for the next data.
+        timeout : float, optional
+            The maximum time to wait, in seconds. Default is None, which
+            waits forever.
+
+        Returns
+        -------
+        int
+            The current data version. It is equal to `last_version` if the
+            wait timed out.
+        """
+        with self.data_condition:
+            if last_version is None:
+                last_version = self.data_version
+            self.data_condition.wait_for(
+                lambda: self.data_version != last_version, timeout=timeout
+            )
+            return self.data_version
 
     def _run_node(
         self,
@@ -140,12 +702,101 @@ class FitRunner:
         # A fail-safe check
         assert self.is_marked(node_id, "initialized")
         node = dag.nodes[node_id]
+        payload, metrics = _run_action(
+            node["buffer"]["adapter"],
+            node["buffer"]["payload"],
+            node["action"],
+        )
+        self._cache_result(dag, node_id, payload)
+        self._complete_node(dag, node_id, payload, metrics)
+
+    def _restore_node(self, dag, node_id, payload, source):
+        """Complete a node with a saved payload instead of running it."""
+        assert self.is_marked(node_id, "initialized")
+        start_time = time.time()
+        start = time.perf_counter()
+        node = dag.nodes[node_id]
+        adapter = node["buffer"]["adapter"]
+        adapter.apply_payload(payload)
+        adapter.free_parameters(node["action"])
+        self._refresh_snapshots(adapter)
+        metrics = {
+            "source": source,
+            "start_time": start_time,
+            "pid": os.getpid(),
+            "wall_time": time.perf_counter() - start,
+        }
+        self._complete_node(dag, node_id, payload, metrics)
+
+    def _run_nodes_in_workers(self, dag, node_ids):
+        """Run independent nodes at the same time in worker processes."""
+        executor = self._get_executor()
+        futures = {}
+        for node_id in node_ids:
+            assert self.is_marked(node_id, "initialized")
+            node = dag.nodes[node_id]
+            future = executor.submit(
+                _run_node_in_worker,
+                node["buffer"]["adapter"],
+                node["buffer"]["payload"],
+                node["action"],
+            )
+            futures[future] = node_id
+        for future in as_completed(futures):
+            node_id = futures[future]
+            payload, metrics = future.result()
+            self._complete_worker_node(dag, node_id, payload, metrics)
+
+    def _complete_worker_node(self, dag, node_id, payload, metrics):
+        """Bring the local adapter of a node run in a worker process to
+        the state reached in the worker, and complete the node.
+
+        The time spent here and the residual evaluations of the snapshot
+        refresh are added to the metrics, as "sync_time" in the wall time,
+        so worker and local nodes are compared on the same work.
+        """
+        node = dag.nodes[node_id]
         adapter = node["buffer"]["adapter"]
-        adapter.apply_payload(node["buffer"]["payload"])
-        adapter.action_func_factory(node["action"])()
-        node["payload"] = adapter.get_payload()
+        start = time.perf_counter()
+        count = getattr(adapter, "residual_count", None)
+        adapter.apply_payload(payload)
+        adapter.free_parameters(node["action"])
+        self._refresh_snapshots(adapter)
+        metrics["sync_time"] = time.perf_counter() - start
+        metrics["wall_time"] += metrics["sync_time"]
+        if count is not None and metrics.get("neval") is not None:
+            metrics["neval"] += adapter.residual_count - count
+        self._cache_result(dag, node_id, payload)
+        metrics["source"] = "worker"
+        self._complete_node(dag, node_id, payload, metrics)
+
+    def _refresh_snapshots(self, adapter):
+        """Update the snapshots of an adapter whose state was set from a
+        payload computed elsewhere, if they are watched."""
+        if not hasattr(adapter, "refresh_snapshots"):
+            return
+        if any(
+            this_event["source"] == "adapter"
+            for this_event in self.collect_data_event.values()
+        ):
+            adapter.refresh_snapshots()
+
+    def _complete_node(self, dag, node_id, payload, metrics):
+        dag.nodes[node_id]["payload"] = payload
+        dag.nodes[node_id]["metrics"] = metrics
         self.mark(node_id, "completed")
+        if self.checkpoint_path is not None:
+            self._write_checkpoint(dag)
+        start = time.perf_counter()
         self._collect_data_realtime(dag, node_id)
+        metrics["collect_time"] = time.perf_counter() - start
+        metrics["wall_time"] += metrics["collect_time"]
+        if self.tracer is not None:
+            self._trace_node(dag, node_id)
+
+    def _set_adapter_tracer(self, adapter):
+        if self.tracer is not None and hasattr(adapter, "set_tracer"):
+            adapter.set_tracer(self.tracer, every=self.residual_trace_every)
 
     def _update_successors(self, dag, node_id, Adapter):
         """Update the sucessors for the current node."""
@@ -161,7 +812,8 @@ class FitRunner:
             if count == 0:
                 succ_node["buffer"]["adapter"] = adapter
             else:
-                succ_node["buffer"]["adapter"] = adapter.clone()
+                with self._trace("clone adapter"):
+                    succ_node["buffer"]["adapter"] = adapter.clone()
             count += 1
             self.mark(succ_id, "hasAdapter")
         return succ_ids
@@ -172,13 +824,52 @@ class FitRunner:
         Adapter: type,
         inputs: dict,
         payload: dict,
+        adapter=None,
+        completed=None,
     ):
-        self.running_info = {}
+        """Run the DAG from its root node.
+
+        Parameters
+        ----------
+        dag : FitDAG
+            The DAG to run. It must have a single root node.
+        Adapter : type
+            The adapter class used to create the adapter for the root node.
+        inputs : dict
+            The inputs loaded into the adapter.
+        payload : dict
+            The payload passed to the root node.
+        adapter : object, optional
+            An adapter instance to reuse, e.g. the one of a previous fit in a
+            sequential refinement. Its inputs are replaced with
+            `adapter.update_inputs(inputs)`, which allows the adapter to keep
+            whatever does not depend on the changed inputs. Default is None,
+            which creates a new adapter from `Adapter`.
+        completed : dict, optional
+            The payloads of the nodes completed before, keyed by node ID.
+            These nodes are not run again: their payloads are applied to the
+            adapter and passed to their successors. Default is None, which
+            runs every node. See `resume_dag`.
+
+        Returns
+        -------
+        FitDAG
+            The same DAG with the payload of each node filled in.
+        """
+        with self._status_lock:
+            self.running_info = {}
+        self._start_run(dag, inputs, payload)
+        completed = completed or {}
         assert len(dag.root_nodes) == 1
         root_node_id = dag.root_nodes[0]
         root_node = dag.nodes[root_node_id]
-        adapter = Adapter()
-        adapter.load_inputs(inputs)
+        with self._trace("load inputs"):
+            if adapter is None:
+                adapter = Adapter()
+                adapter.load_inputs(inputs)
+            else:
+                adapter.update_inputs(inputs)
+        self._set_adapter_tracer(adapter)
         root_node["buffer"] = {"adapter": adapter, "payload": payload}
         self.mark(root_node_id, "hasPayload")
         self.mark(root_node_id, "hasAdapter")
@@ -202,10 +893,27 @@ class FitRunner:
             iter_count += 1
             all_succ_ids = []
             for node_id in ready_node_ids:
-                self._run_node(
-                    dag,
-                    node_id,
-                )
+                if node_id in completed:
+                    self._restore_node(
+                        dag, node_id, completed[node_id], "completed"
+                    )
+                    continue
+                cached_payload = self._get_cached_result(dag, node_id)
+                if cached_payload is not None:
+                    self._restore_node(dag, node_id, cached_payload, "cache")
+            pending_node_ids = [
+                node_id
+                for node_id in ready_node_ids
+                if not self.is_marked(node_id, "completed")
+            ]
+            if self.max_workers > 1 and len(pending_node_ids) > 1:
+                self._run_nodes_in_workers(dag, pending_node_ids)
+            for node_id in ready_node_ids:
+                if not self.is_marked(node_id, "completed"):
+                    self._run_node(
+                        dag,
+                        node_id,
+                    )
                 succ_ids = self._update_successors(dag, node_id, Adapter)
                 all_succ_ids.extend(succ_ids)
                 finished_nodes_number += 1
@@ -214,9 +922,175 @@ class FitRunner:
                 id for id in succ_ids if self.is_marked(id, "initialized")
             ]
         end_time = time.time()
+        dag.graph["metrics"] = {"wall_time": end_time - start_time}
+        if self.tracer is not None:
+            self.tracer.add_span("dag", start_time, end_time, category="dag")
         print(f"\tThis dag is finished. Caused {end_time-start_time}s")
         return dag
 
+    async def run_dag_async(
+        self,
+        dag: FitDAG,
+        Adapter: type,
+        inputs: dict,
+        payload: dict,
+        adapter=None,
+        executor=None,
+    ):
+        """Run the DAG from its root node without blocking the event loop.
+
+        The loading of the inputs and the action of every node are run in
+        `executor`, and the control goes back to the event loop between the
+        nodes. Several DAGs can be scheduled on the same event loop, with
+        this runner or with different ones. Use `wait_for_node` to wait for
+        the completion of a given node.
+
+        Parameters
+        ----------
+        dag : FitDAG
+            The DAG to run. It must have a single root node.
+        Adapter : type
+            The adapter class used to create the adapter for the root node.
+        inputs : dict
+            The inputs loaded into the adapter.
+        payload : dict
+            The payload passed to the root node.
+        adapter : object, optional
+            An adapter instance to reuse. See `_run_dag`.
+        executor : concurrent.futures.Executor, optional
+            The executor running the CPU-bound work. Default is None, which
+            uses the default executor of the event loop. With a
+            ProcessPoolExecutor, the nodes are run on copies of their
+            adapters as in `set_concurrency`.
+
+        Returns
+        -------
+        FitDAG
+            The same DAG with the payload of each node filled in.
+        """
+        loop = asyncio.get_running_loop()
+        # Keep the status of the other DAGs run by this runner.
+        with self._status_lock:
+            node_status = self.running_info.setdefault(
+                "node_status", defaultdict(list)
+            )
+            for node_id in dag.nodes:
+                node_status.pop(node_id, None)
+        for node_id in dag.nodes:
+            self._get_node_event(node_id).clear()
+        try:
+            return await self._run_dag_async(
+                dag, Adapter, inputs, payload, adapter, executor
+            )
+        finally:
+            # The waiters were woken up when the events were set, and the
+            # later ones see the completed status.
+            events = self.node_events.get(loop, {})
+            for node_id in dag.nodes:
+                events.pop(node_id, None)
+
+    async def _run_dag_async(
+        self, dag, Adapter, inputs, payload, adapter, executor
+    ):
+        loop = asyncio.get_running_loop()
+        self._start_run(dag, inputs, payload)
+        assert len(dag.root_nodes) == 1
+        root_node_id = dag.root_nodes[0]
+        # The adapter of the root node lives in this process.
+        local_executor = (
+            None if isinstance(executor, ProcessPoolExecutor) else executor
+        )
+        with self._trace("load inputs"):
+            if adapter is None:
+                adapter = Adapter()
+                await loop.run_in_executor(
+                    local_executor, adapter.load_inputs, inputs
+                )
+            else:
+                await loop.run_in_executor(
+                    local_executor, adapter.update_inputs, inputs
+                )
+        self._set_adapter_tracer(adapter)
+        dag.nodes[root_node_id]["buffer"] = {
+            "adapter": adapter,
+            "payload": payload,
+        }
+        self.mark(root_node_id, "hasPayload")
+        self.mark(root_node_id, "hasAdapter")
+        start_time = time.time()
+        max_iter = len(dag.nodes) + 1
+        iter_count = 0
+        ready_node_ids = [root_node_id]
+        while ready_node_ids:
+            if iter_count > max_iter:
+                warnings.warn(
+                    "Maximum iterations reached in FitDAG execution. "
+                    "Possible cyclic dependency or deadlock."
+                )
+                return dag
+            iter_count += 1
+            await asyncio.gather(
+                *[
+                    self._run_node_async(dag, node_id, executor)
+                    for node_id in ready_node_ids
+                ]
+            )
+            all_succ_ids = []
+            for node_id in ready_node_ids:
+                succ_ids = self._update_successors(dag, node_id, Adapter)
+                all_succ_ids.extend(succ_ids)
+            succ_ids = list(set(all_succ_ids))
+            ready_node_ids = [
+                id for id in succ_ids if self.is_marked(id, "initialized")
+            ]
+        end_time = time.time()
+        dag.graph["metrics"] = {"wall_time": end_time - start_time}
+        if self.tracer is not None:
+            self.tracer.add_span("dag", start_time, end_time, category="dag")
+        print(f"\tThis dag is finished. Caused {end_time-start_time}s")
+        return dag
+
+    async def _run_node_async(self, dag, node_id, executor):
+        loop = asyncio.get_running_loop()
+        cached_payload = self._get_cached_result(dag, node_id)
+        if cached_payload is not None:
+            self._restore_node(dag, node_id, cached_payload, "cache")
+        elif isinstance(executor, ProcessPoolExecutor):
+            assert self.is_marked(node_id, "initialized")
+            node = dag.nodes[node_id]
+            adapter = node["buffer"]["adapter"]
+            payload, metrics = await loop.run_in_executor(
+                executor,
+                _run_node_in_worker,
+                adapter,
+                node["buffer"]["payload"],
+                node["action"],
+            )
+            self._complete_worker_node(dag, node_id, payload, metrics)
+        else:
+            await loop.run_in_executor(executor, self._run_node, dag, node_id)
+        self._get_node_event(node_id).set()
+
+    def _get_node_event(self, node_id):
+        # An asyncio.Event can only be awaited in the loop it is used first.
+        loop = asyncio.get_running_loop()
+        events = self.node_events.setdefault(loop, {})
+        if node_id not in events:
+            events[node_id] = asyncio.Event()
+        return events[node_id]
+
+    async def wait_for_node(self, node_id):
+        """Wait until a node run by `run_dag_async` is completed.
+
+        Parameters
+        ----------
+        node_id : str
+            The ID of the node.
+        """
+        if self.is_marked(node_id, "completed"):
+            return
+        await self._get_node_event(node_id).wait()
+
     def get_run_dag_thread(
         self,
         dag: FitDAG,
@@ -233,32 +1107,80 @@ class FitRunner:
         t = threading.Thread(target=self._run_dag, kwargs=kwargs)
         return t
 
+    def get_metrics(self, dag):
+        """Aggregate the metrics recorded in the nodes of a completed DAG.
+
+        Parameters
+        ----------
+        dag : FitDAG
+            The DAG run by this runner.
+
+        Returns
+        -------
+        dict
+            "wall_time" is the time spent running the whole DAG. "total" sums
+            the times and the evaluation counts over the nodes. "sources"
+            counts the nodes by how they were completed: "run" and "worker"
+            nodes were run, "cache" and "completed" ones reused a payload.
+            "nodes" lists the metrics of each node in topological order, with
+            its ID and name.
+        """
+        total = defaultdict(float)
+        sources = defaultdict(int)
+        nodes = []
+        for node_id in dag.topological_order:
+            node = dag.nodes[node_id]
+            metrics = node.get("metrics") or {}
+            nodes.append({"id": node_id, "name": node["name"], **metrics})
+            if "source" in metrics:
+                sources[metrics["source"]] += 1
+            for key in (
+                "wall_time",
+                "cpu_time",
+                "apply_payload_time",
+                "least_squares_time",
+                "sync_time",
+                "collect_time",
+                "nfev",
+                "njev",
+                "neval",
+            ):
+                if metrics.get(key) is not None:
+                    total[key] += metrics[key]
+        for key in ("nfev", "njev", "neval"):
+            if key in total:
+                total[key] = int(total[key])
+        return {
+            "wall_time": dag.graph.get("metrics", {}).get("wall_time"),
+            "total": dict(total),
+            "sources": dict(sources),
+            "nodes": nodes,
+        }
+
     def mark(self, node_id, tag):
         """Mark the running status of a node.
 
         Used by FitRunner.
         """
-        if "node_status" not in self.running_info:
-            self.running_info["node_status"] = defaultdict(list)
         allowed_tags = ["hasPayload", "hasAdapter", "completed"]
         # FIXME: implement the error later
         assert tag in allowed_tags
-        self.running_info["node_status"][node_id].append(tag)
+        with self._status_lock:
+            node_status = self.running_info.setdefault(
+                "node_status", defaultdict(list)
+            )
+            node_status[node_id].append(tag)
 
     def is_marked(self, node_id, status):
         """Check the running status of a node.
 
         Used by FitRunner.
         """
-        if "node_status" not in self.running_info:
-            return False
+        with self._status_lock:
+            if "node_status" not in self.running_info:
+                return False
+            tags = list(self.running_info["node_status"].get(node_id, []))
         if status == "initialized":
-            return set(["hasPayload", "hasAdapter"]) == set(
-                self.running_info["node_status"][node_id]
-            )
+            return set(["hasPayload", "hasAdapter"]) == set(tags)
         elif status == "completed":
-            return (
-                len(self.running_info["node_status"][node_id]) == 3
-                and "completed"
-                == self.running_info["node_status"][node_id][-1]
-            )
+            return len(tags) == 3 and "completed" == tags[-1]
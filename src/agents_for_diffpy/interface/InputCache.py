@@ -0,0 +1,119 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+class InputCache:
+    """Least-recently-used cache of parsed inputs.
+
+    Parsing the structure and the profile strings is a large part of the
+    cost of loading an adapter, and the same strings are parsed over and
+    over: the launcher reads the same structure file for every profile,
+    and every branch of a DAG used to reload the inputs of its parent. The
+    cache keys the parsed objects by a hash of the input text and of the
+    settings used to parse it, and evicts the least recently used entries
+    once their total size exceeds `max_bytes`.
+
+    The cached objects are shared by every caller. Callers must either treat
+    them as read-only or copy them before modifying them.
+
+    Attributes
+    ----------
+    max_bytes : int
+        The memory bound of the cache, in bytes.
+    hits : int
+        The number of lookups that found a cached entry.
+    misses : int
+        The number of lookups that had to parse the inputs.
+    """
+
+    def __init__(self, max_bytes=256 * 1024**2):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind, text, **settings):
+        """Make a cache key from the input text and its parse settings.
+
+        Parameters
+        ----------
+        kind : str
+            The kind of the cached object, e.g. "structure" or "profile".
+        text : str
+            The input text to be parsed.
+        **settings
+            The JSON-serializable settings the parsed object depends on.
+            NumPy scalars are converted to float.
+
+        Returns
+        -------
+        str
+            The hexadecimal digest identifying the parsed object.
+        """
+        digest = hashlib.sha256()
+        digest.update(kind.encode())
+        digest.update(
+            json.dumps(settings, sort_keys=True, default=float).encode()
+        )
+        digest.update(text.encode())
+        return digest.hexdigest()
+
+    def get(self, key, parse):
+        """Get the cached object for the key, parsing it on a miss.
+
+        Parameters
+        ----------
+        key : str
+            The key made by `make_key`.
+        parse : callable
+            The function called without arguments on a cache miss. It returns
+            the tuple (obj, nbytes) where `nbytes` estimates the memory used
+            by `obj`.
+
+        Returns
+        -------
+        object
+            The cached or newly parsed object.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        obj, nbytes = parse()
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (obj, nbytes)
+                self._nbytes += nbytes
+                self._evict()
+        return obj
+
+    def _evict(self):
+        # Always keep the newest entry, even if it alone exceeds the bound.
+        while self._nbytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self._nbytes -= nbytes
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Remove all the entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+input_cache = InputCache()
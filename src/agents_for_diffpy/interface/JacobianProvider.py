@@ -0,0 +1,180 @@
+import threading
+import numpy
+from concurrent.futures import ProcessPoolExecutor
+from agents_for_diffpy.interface.PoolRegistry import pool_registry
+
+# The adapter of a worker process, and the inputs and parameter state it
+# was last synchronized to
+_worker = {"adapter": None, "inputs_version": None, "state": None}
+
+
+def _init_worker(Adapter):
+    # The workers already run in parallel, the PDF calculation inside each
+    # of them does not need another pool.
+    pool_registry.configure(ncpu=1)
+    _worker["adapter"] = Adapter()
+    _worker["inputs_version"] = None
+    _worker["state"] = None
+
+
+def _evaluate_residual(inputs_version, inputs, state, p):
+    adapter = _worker["adapter"]
+    if inputs_version != _worker["inputs_version"]:
+        # A new profile on the same setup is swapped into the recipe.
+        adapter.update_inputs(inputs)
+        _worker["inputs_version"] = inputs_version
+        _worker["state"] = None
+    if state != _worker["state"]:
+        values, free = state
+        adapter._recipe.fix("all")
+        adapter._apply_parameter_values(values)
+        for name in free:
+            adapter._recipe.free(name)
+        _worker["state"] = state
+    return adapter._residual(p, snapshot=False)
+
+
+class JacobianProvider:
+    """Finite-difference Jacobian of the adapter residual evaluated in
+    worker processes.
+
+    `scipy.optimize.least_squares` builds the Jacobian by evaluating the
+    residual once per free variable, one evaluation after another. The
+    provider evaluates the perturbed parameter vectors at the same time, each
+    worker holding its own copy of the recipe. Before an evaluation, the
+    copy is synchronized with the inputs, the parameter values and the free
+    variables of the calling adapter, so a provider can be shared by an
+    adapter and its clones, and kept when the adapter is updated with new
+    inputs. The workers are started once.
+
+    Attributes
+    ----------
+    scheme : {"2-point", "3-point"}
+        The finite-difference scheme. "2-point" uses forward differences,
+        "3-point" uses central differences with twice as many evaluations.
+    rel_step : float or None
+        The relative step size. As in `scipy.optimize.least_squares`, the
+        absolute step of a variable with value x is ``rel_step * |x|``, and
+        None uses the default step of the scheme, ``eps**(1/2)`` or
+        ``eps**(1/3)`` times ``max(1, |x|)``.
+    max_workers : int
+        The number of worker processes.
+    """
+
+    def __init__(self, scheme="2-point", rel_step=None, max_workers=None):
+        if scheme not in ("2-point", "3-point"):
+            raise ValueError(
+                f"Unknown scheme: {scheme}. "
+                "Please choose one of {'2-point', '3-point'}."
+            )
+        eps = numpy.finfo(float).eps
+        self.scheme = scheme
+        self.rel_step = rel_step
+        self._default_step = (
+            eps**0.5 if scheme == "2-point" else eps ** (1 / 3)
+        )
+        self.max_workers = (
+            max_workers if max_workers is not None else pool_registry.ncpu
+        )
+        self._executor = None
+        self._Adapter = None
+        # The inputs last sent to the workers, numbered by their version
+        self._inputs = None
+        self._inputs_version = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self, adapter):
+        with self._lock:
+            if self._executor is None or type(adapter) is not self._Adapter:
+                self.shutdown()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_init_worker,
+                    initargs=(type(adapter),),
+                )
+                self._Adapter = type(adapter)
+            if adapter.inputs is not self._inputs:
+                if adapter.inputs != self._inputs:
+                    self._inputs_version += 1
+                self._inputs = adapter.inputs
+            return self._executor, self._inputs_version
+
+    def _get_step(self, p):
+        """Get the absolute steps, as `scipy.optimize.least_squares`."""
+        sign = numpy.where(p >= 0, 1.0, -1.0)
+        default = self._default_step * sign * numpy.maximum(1.0, numpy.abs(p))
+        if self.rel_step is None:
+            return default
+        h = self.rel_step * sign * numpy.abs(p)
+        # A step lost in the rounding of p falls back to the default one.
+        return numpy.where((p + h) - p == 0, default, h)
+
+    def jacobian(self, adapter, p, f0=None):
+        """Evaluate the Jacobian of the adapter residual.
+
+        Parameters
+        ----------
+        adapter : PDFAdapter
+            The adapter whose residual is differentiated.
+        p : array_like
+            The values of the free variables.
+        f0 : numpy.ndarray, optional
+            The residual at `p`, if already known. Only used by the
+            "2-point" scheme.
+
+        Returns
+        -------
+        numpy.ndarray
+            The Jacobian matrix of shape (len(residual), len(p)).
+        """
+        p = numpy.asarray(p, dtype=float)
+        h = self._get_step(p)
+        vectors = []
+        for j in range(len(p)):
+            forward = p.copy()
+            forward[j] += h[j]
+            vectors.append(forward)
+            if self.scheme == "3-point":
+                backward = p.copy()
+                backward[j] -= h[j]
+                vectors.append(backward)
+        if self.scheme == "2-point" and f0 is None:
+            vectors.append(p)
+        values = adapter._get_parameter_values()
+        free = tuple(adapter._recipe.getNames())
+        state = (values, free)
+        executor, inputs_version = self._get_executor(adapter)
+        n = len(vectors)
+        residuals = list(
+            executor.map(
+                _evaluate_residual,
+                [inputs_version] * n,
+                [adapter.inputs] * n,
+                [state] * n,
+                vectors,
+            )
+        )
+        adapter.residual_count += len(vectors)
+        # Divide by the steps that are exactly representable around p.
+        if self.scheme == "2-point":
+            if f0 is None:
+                f0 = residuals.pop()
+            columns = [
+                (residuals[j] - f0) / ((p[j] + h[j]) - p[j])
+                for j in range(len(p))
+            ]
+        else:
+            columns = [
+                (residuals[2 * j] - residuals[2 * j + 1])
+                / ((p[j] + h[j]) - (p[j] - h[j]))
+                for j in range(len(p))
+            ]
+        return numpy.column_stack(columns)
+
+    def shutdown(self):
+        """Shut down the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._Adapter = None
+            self._inputs = None
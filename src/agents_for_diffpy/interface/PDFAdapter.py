@@ -10,6 +10,24 @@ from diffpy.srfit.pdf import PDFGenerator
 import numpy
 from scipy.optimize import least_squares
 import difflib
+import copy
+import json
+import pickle
+from collections import OrderedDict
+from agents_for_diffpy.interface.PoolRegistry import pool_registry
+from agents_for_diffpy.interface.InputCache import input_cache
+from agents_for_diffpy.interface.JacobianProvider import JacobianProvider
+from agents_for_diffpy.interface.RingBuffer import RingBuffer
+from agents_for_diffpy.interface.SnapshotPolicy import SnapshotPolicy
+
+# The metadata of the profile header read by the PDF generator when the
+# profile is set, see BasePDFGenerator.processMetaData
+_GENERATOR_METADATA = ("stype", "qmax", "qmin", *PDFGenerator._parnames)
+# The adapters built by __setstate__, keyed by their inputs. A worker process
+# receives a copy of an adapter for every node it runs, and copies the recipe
+# built for the first one instead of building it again.
+_unpickled_templates = OrderedDict()
+_MAX_UNPICKLED_TEMPLATES = 4
 
 
 class PDFAdapter:
@@ -19,6 +37,9 @@ class PDFAdapter:
     ----------
     _recipe : FitRecipe
         The FitRecipe object managing the fitting process.
+    residual_count : int
+        The number of residual evaluations, including the finite
+        differences and those of the Jacobian provider's workers.
 
     Methods
     -------
@@ -68,8 +89,27 @@ class PDFAdapter:
                 ]
             )
         self.inputs = None
+        # Parameter values of the freshly loaded recipe
+        self._initial_values = {}
         # Used to store intermediate results
         self.snapshots = {}
+        # Which evaluations are captured, and where, see set_snapshot_policy
+        self.snapshot_policy = SnapshotPolicy()
+        self._snapshot_buffers = {}
+        # How least_squares gets the Jacobian, see set_jacobian
+        self.jacobian_settings = {
+            "scheme": "2-point",
+            "rel_step": None,
+            "parallel": False,
+            "max_workers": None,
+        }
+        self._jacobian_provider = None
+        # The last evaluated parameter vector and its residual
+        self._last_evaluation = None
+        # Records the sampled residual evaluations, see set_tracer
+        self.tracer = None
+        self.trace_every = 100
+        self.residual_count = 0
 
     def if_ready(func):
         def wrapper(self, *args, **kwargs):
@@ -105,9 +145,146 @@ class PDFAdapter:
             k: inputs[k] for k in recipe_input_keys if k in inputs
         }
         self._make_recipe(**recipe_inputs)
+        self._reset_snapshots()
         if "remove_vars" in inputs:
             for var_name in inputs["remove_vars"]:
                 self.delVar(var_name)
+        self._initial_values = self._get_parameter_values()
+
+    def update_inputs(self, inputs):
+        """Update the inputs, reusing the current recipe when possible.
+
+        When only the profile data differ from the current inputs, and the
+        new profile is observed on the same r-grid with the same generator
+        settings in its header, e.g. qmax or qdamp, the observed G(r) and its
+        uncertainty are swapped into the existing profile. The structure,
+        generator, constraints and variables are kept, and the parameter
+        values and fix/free status are reset to those of a freshly loaded
+        recipe. Otherwise the recipe is rebuilt with `load_inputs`.
+
+        Parameters
+        ----------
+        inputs : dict
+            The same inputs accepted by `load_inputs`.
+
+        Returns
+        -------
+        bool
+            True if the profile was swapped into the current recipe, False if
+            the recipe was rebuilt.
+        """
+        if not self.ready or not self._is_same_setup(inputs):
+            self.load_inputs(inputs)
+            return False
+        parsed = self._load_profile(
+            inputs["profile_string"],
+            inputs.get("xmin"),
+            inputs.get("xmax"),
+            inputs.get("dx"),
+        )
+        profile = self._recipe._contributions["pdfcontribution"].profile
+        same_header = self._get_generator_metadata(
+            parsed["meta"]
+        ) == self._get_generator_metadata(profile.meta)
+        if not same_header or not numpy.array_equal(
+            parsed["xobs"], profile.xobs
+        ):
+            self.load_inputs(inputs)
+            return False
+        # The calculation points are kept, y and dy are rebinned onto them.
+        profile.setObservedProfile(
+            parsed["xobs"], parsed["yobs"], parsed["dyobs"]
+        )
+        profile.meta = dict(parsed["meta"])
+        self.inputs = inputs
+        self._reset_snapshots()
+        self._recipe.fix("all")
+        self._apply_parameter_values(self._initial_values)
+        return True
+
+    def _is_same_setup(self, inputs):
+        """Check if the inputs differ from the current ones only in the
+        profile data."""
+        if self.inputs is None:
+            return False
+        current = {
+            k: v for k, v in self.inputs.items() if k != "profile_string"
+        }
+        new = {k: v for k, v in inputs.items() if k != "profile_string"}
+        return current == new and "profile_string" in inputs
+
+    @staticmethod
+    def _get_generator_metadata(meta):
+        return {k: meta[k] for k in _GENERATOR_METADATA if k in meta}
+
+    @staticmethod
+    def _load_structure(structure_string):
+        """Get the structure and its space group from the input cache.
+
+        Returns
+        -------
+        structure : diffpy.structure.Structure
+            A private copy of the cached structure, which can be modified by
+            the recipe.
+        spacegroup : str
+            The short name of the space group.
+        """
+
+        def parse():
+            stru_parser = getParser("cif")
+            structure = stru_parser.parse(structure_string)
+            sg = getattr(stru_parser, "spacegroup", None)
+            spacegroup = sg.short_name if sg else "P1"
+            # The size of the text is a fair estimate of the parsed structure.
+            return (structure, spacegroup), len(structure_string)
+
+        key = input_cache.make_key("structure", structure_string)
+        structure, spacegroup = input_cache.get(key, parse)
+        return structure.copy(), spacegroup
+
+    @staticmethod
+    def _load_profile(profile_string, xmin=None, xmax=None, dx=None):
+        """Get the observed profile and its calculation range from the input
+        cache.
+
+        Returns
+        -------
+        dict
+            The read-only "xobs", "yobs", "dyobs" arrays, the "meta"
+            dictionary of the profile, and the "xmin", "xmax", "dx" of the
+            calculation range with the unspecified values taken from the
+            observed r-grid. The dictionary is shared and must not be
+            modified.
+        """
+
+        def parse():
+            parser = PDFParser()
+            parser.parseString(profile_string)
+            xobs, yobs, _, dyobs = parser.getData()
+            xobs = numpy.asarray(xobs, dtype=float)
+            yobs = numpy.asarray(yobs, dtype=float)
+            dyobs = (
+                numpy.ones_like(xobs)
+                if dyobs is None
+                else numpy.asarray(dyobs, dtype=float)
+            )
+            for array in (xobs, yobs, dyobs):
+                array.setflags(write=False)
+            parsed = {
+                "xobs": xobs,
+                "yobs": yobs,
+                "dyobs": dyobs,
+                "meta": dict(parser.getMetaData()),
+                "xmin": xmin if xmin is not None else numpy.min(xobs),
+                "xmax": xmax if xmax is not None else numpy.max(xobs),
+                "dx": dx if dx is not None else numpy.mean(numpy.diff(xobs)),
+            }
+            return parsed, xobs.nbytes + yobs.nbytes + dyobs.nbytes
+
+        key = input_cache.make_key(
+            "profile", profile_string, xmin=xmin, xmax=xmax, dx=dx
+        )
+        return input_cache.get(key, parse)
 
     def _make_recipe(
         self,
@@ -128,20 +305,18 @@ class PDFAdapter:
             'structure_path' and 'profile_path'.
         """
         # load structure and profile
-        stru_parser = getParser("cif")
-        structure = stru_parser.parse(structure_string)
-        sg = getattr(stru_parser, "spacegroup", None)
-        spacegroup = sg.short_name if sg else "P1"
+        structure, spacegroup = self._load_structure(structure_string)
+        parsed = self._load_profile(profile_string, xmin, xmax, dx)
         profile = Profile()
-        parser = PDFParser()
-        parser.parseString(profile_string)
-        profile.loadParsedData(parser)
+        profile.setObservedProfile(
+            parsed["xobs"], parsed["yobs"], parsed["dyobs"]
+        )
+        profile.meta = dict(parsed["meta"])
         # set up PDF generator, contribution, and recipe
-        xmin = xmin if xmin is not None else numpy.min(profile._xobs)
-        xmax = xmax if xmax is not None else numpy.max(profile._xobs)
-        dx = dx if dx is not None else numpy.mean(numpy.diff(profile._xobs))
         contribution = FitContribution("pdfcontribution")
-        profile.setCalculationRange(xmin=xmin, xmax=xmax, dx=dx)
+        profile.setCalculationRange(
+            xmin=parsed["xmin"], xmax=parsed["xmax"], dx=parsed["dx"]
+        )
         contribution.setProfile(profile)
         pdfgenerator = PDFGenerator("pdfgenerator")
         contribution.addProfileGenerator(pdfgenerator)
@@ -152,26 +327,12 @@ class PDFAdapter:
             pdfgenerator.setQmin(qmin)
         recipe = FitRecipe()
         recipe.addContribution(contribution)
-        RUN_PARALLEL = True
-        if RUN_PARALLEL:
-            try:
-                import psutil
-                import multiprocessing
-                from multiprocessing import Pool
-
-                syst_cores = multiprocessing.cpu_count()
-                cpu_percent = psutil.cpu_percent()
-                avail_cores = numpy.floor(
-                    (100 - cpu_percent) / (100.0 / syst_cores)
-                )
-                ncpu = int(numpy.max([1, avail_cores]))
-                pool = Pool(processes=ncpu)
-                pdfgenerator.parallel(ncpu=ncpu, mapfunc=pool.map)
-            except ImportError:
-                print(
-                    "\nYou don't appear to have the necessary packages for "
-                    "parallelization"
-                )
+        # The pool is owned by the process and shared by every recipe. It is
+        # looked up at each calculation, as it is replaced by configure.
+        if pool_registry.ncpu > 1:
+            pdfgenerator.parallel(
+                ncpu=pool_registry.ncpu, mapfunc=pool_registry.map
+            )
         # find all parameters and add them to recipe variables
         for pname in [
             "qdamp",
@@ -279,6 +440,70 @@ class PDFAdapter:
         payload = self._get_parameter_values()
         return payload
 
+    @if_ready
+    def free_parameters(self, action_names):
+        """Free the variables designated by the actions without refining
+        them.
+
+        This is the state change an action leaves on the recipe besides the
+        new parameter values. It is used to bring an adapter up to date when
+        the action was executed by a copy of it, e.g. in a worker process.
+
+        Parameters
+        ----------
+        action_names: list of str
+            The instruction strings appeared at each node in FitDAG.
+        """
+        for name in action_names:
+            if name == "all":
+                self._recipe.free("all")
+                break
+            self._recipe.free(name)
+
+    def set_jacobian(
+        self, scheme="2-point", rel_step=None, parallel=False, max_workers=None
+    ):
+        """Set how the Jacobian is computed in the least-squares refinement.
+
+        Parameters
+        ----------
+        scheme : {"2-point", "3-point"}, optional
+            The finite-difference scheme. Default is "2-point".
+        rel_step : float, optional
+            The relative step size. Default is None, which uses the default
+            of `scipy.optimize.least_squares` for the scheme.
+        parallel : bool, optional
+            Whether the perturbed parameter vectors are evaluated at the same
+            time in worker processes, see JacobianProvider. Default is False,
+            which lets `least_squares` evaluate them one after another.
+            The provider is shared with the clones of this adapter.
+        max_workers : int, optional
+            The number of worker processes when `parallel` is True. Default
+            is None, which uses the size of the shared process pool.
+        """
+        if self._jacobian_provider is not None:
+            self._jacobian_provider.shutdown()
+            self._jacobian_provider = None
+        self._last_evaluation = None
+        self.jacobian_settings = {
+            "scheme": scheme,
+            "rel_step": rel_step,
+            "parallel": parallel,
+            "max_workers": max_workers,
+        }
+        if parallel:
+            self._jacobian_provider = JacobianProvider(
+                scheme=scheme, rel_step=rel_step, max_workers=max_workers
+            )
+
+    def _jacobian(self, p):
+        f0 = None
+        if self._last_evaluation is not None:
+            last_p, last_chiv = self._last_evaluation
+            if numpy.array_equal(last_p, p):
+                f0 = last_chiv
+        return self._jacobian_provider.jacobian(self, p, f0=f0)
+
     @if_ready
     def action_func_factory(self, action_names):
         """Generate operations to be performed in the FitRunner.
@@ -287,6 +512,13 @@ class PDFAdapter:
         ----------
         action_names: list of str
             The instruction strings appeared at each node in FitDAG.
+
+        Returns
+        -------
+        callable
+            The function running the refinement. It returns the result of
+            `scipy.optimize.least_squares`, or None if there is nothing to
+            refine.
         """
 
         def action_func():
@@ -295,23 +527,42 @@ class PDFAdapter:
             # variable in FitResults
             if action_names == []:
                 return None
-            for name in action_names:
-                if name == "all":
-                    self._recipe.free("all")
-                    break
-                self._recipe.free(name)
-            least_squares(
+            self.free_parameters(action_names)
+            if self._jacobian_provider is not None:
+                jac = self._jacobian
+            else:
+                jac = self.jacobian_settings["scheme"]
+            return least_squares(
                 self._residual,
                 self._recipe.values,
+                jac=jac,
+                diff_step=self.jacobian_settings["rel_step"],
                 x_scale="jac",
                 method="trf",
             )
 
         return action_func
 
-    def _residual(self, p=[]):
+    def _residual(self, p=[], snapshot=True):
         """Residual function adapter from FitRecipe in order to capture the
-        intermediate results, the snapshots, during the iterations."""
+        intermediate results, the snapshots, during the iterations.
+
+        Parameters
+        ----------
+        p : array_like, optional
+            The values of the free variables. Default is [], which keeps the
+            current values.
+        snapshot : bool, optional
+            Whether to store the calculated, observed and difference profiles
+            in `snapshots`. Default is True.
+        """
+        trace = (
+            self.tracer is not None
+            and self.residual_count % self.trace_every == 0
+        )
+        self.residual_count += 1
+        if trace:
+            start = self.tracer.now()
         # Prepare, if necessary
         self._recipe._prepare()
 
@@ -348,19 +599,216 @@ class PDFAdapter:
 
         for fithook in self._recipe.fithooks:
             fithook.postcall(self._recipe, chiv)
-        ycalcs = [con._eq() for con in contributions]
-        ys = [con.profile.y for con in contributions]
-        # Store the current snapshots.
-        for i in range(len(contributions)):
-            self.snapshots[f"ycalc_{i}"] = ycalcs[i]
-            self.snapshots[f"y_{i}"] = ys[i]
-            self.snapshots[f"ydiff_{i}"] = ycalcs[i] - ys[i]
+        if snapshot and self.snapshot_policy.should_capture(chiv):
+            # The residual of each contribution has already stored its
+            # calculated profile, no need to evaluate the equation again.
+            for i, con in enumerate(contributions):
+                ycalc, y = con.profile.ycalc, con.profile.y
+                # The profiles are written in place in the ring slots, no
+                # memory is allocated once the rings are full.
+                ycalc_slot = self._claim(f"ycalc_{i}", ycalc.shape)
+                ycalc_slot[:] = ycalc
+                ydiff_slot = self._claim(f"ydiff_{i}", ycalc.shape)
+                numpy.subtract(ycalc, y, out=ydiff_slot)
+                self.snapshots[f"ycalc_{i}"] = self._publish(ycalc_slot)
+                self.snapshots[f"ydiff_{i}"] = self._publish(ydiff_slot)
+                # The observed profile is not modified in place.
+                self.snapshots[f"y_{i}"] = y
+        if self._jacobian_provider is not None:
+            # Reused by the Jacobian provider as f(p).
+            self._last_evaluation = (numpy.array(p, dtype=float), chiv)
+        if trace:
+            self.tracer.add_span(
+                "residual", start, self.tracer.now(), category="residual"
+            )
         return chiv
 
+    @if_ready
+    def refresh_snapshots(self):
+        """Evaluate the residual at the current parameter values to update
+        the snapshots, e.g. after applying a payload computed by a copy of
+        this adapter. The snapshot policy still decides if it is captured.
+        """
+        self._residual(self._recipe.values)
+
+    def set_tracer(self, tracer, every=100):
+        """Record one residual evaluation out of `every` as a span.
+
+        The tracer is shared with the clones of this adapter, but not with
+        its copies in worker processes.
+
+        Parameters
+        ----------
+        tracer : Tracer or None
+            The tracer. None stops the tracing.
+        every : int, optional
+            The sampling period. Default is 100.
+        """
+        self.tracer = tracer
+        self.trace_every = every
+
+    def _reset_snapshots(self):
+        """Forget the snapshots and the evaluations seen by the snapshot
+        policy, e.g. when the inputs change."""
+        self.snapshots = {}
+        self.snapshot_policy.reset()
+        # The buffers keep their memory, the profiles usually keep their
+        # shape.
+        for buffer in self._snapshot_buffers.values():
+            buffer.clear()
+
+    def _claim(self, key, shape):
+        if key not in self._snapshot_buffers:
+            self._snapshot_buffers[key] = RingBuffer(
+                self.snapshot_policy.capacity
+            )
+        return self._snapshot_buffers[key].claim(shape)
+
+    @staticmethod
+    def _publish(slot):
+        view = slot.view()
+        view.setflags(write=False)
+        return view
+
+    def set_snapshot_policy(
+        self, mode="always", every=1, interval_ms=100.0, capacity=8
+    ):
+        """Set which residual evaluations are captured in the snapshots.
+
+        The captured profiles are kept in preallocated ring buffers, see
+        `get_snapshot_history`, and `snapshots` holds read-only views of
+        the most recent ones, which are overwritten after `capacity` more
+        captures. The FitRunner copies the snapshots it collects. The
+        snapshots and the history are cleared when the inputs change.
+
+        Parameters
+        ----------
+        mode : {"always", "off", "every", "interval", "improve"}, optional
+            See SnapshotPolicy. Default is "always".
+        every : int, optional
+            The capture period, in evaluations, of the "every" mode.
+        interval_ms : float, optional
+            The minimum time between two captures of the "interval" mode.
+        capacity : int, optional
+            The number of captured snapshots kept for each profile.
+        """
+        self.snapshot_policy = SnapshotPolicy(
+            mode=mode, every=every, interval_ms=interval_ms, capacity=capacity
+        )
+        self._snapshot_buffers = {}
+
+    def get_snapshot_history(self, key):
+        """Get the captured snapshots of a profile.
+
+        Parameters
+        ----------
+        key : str
+            The snapshot key, e.g. "ycalc_0".
+
+        Returns
+        -------
+        numpy.ndarray
+            A copy of the captured snapshots, from the oldest to the most
+            recent, one per row.
+        """
+        if key not in self._snapshot_buffers:
+            raise KeyError(f"No snapshot captured for '{key}'.")
+        return self._snapshot_buffers[key].to_array()
+
+    def __getstate__(self):
+        """Get the state of the adapter for pickling.
+
+        The recipe holds the process pool and is not pickled. Only the
+        inputs, the parameter values and the free variables are, and the
+        recipe is rebuilt from them when unpickled. The Jacobian settings
+        and the snapshot policy are kept, but the unpickled adapter computes
+        the Jacobian in its own process.
+        """
+        jacobian_settings = dict(self.jacobian_settings, parallel=False)
+        if not self.ready:
+            return {
+                "inputs": self.inputs,
+                "values": {},
+                "free": [],
+                "jacobian_settings": jacobian_settings,
+                "snapshot_policy": self.snapshot_policy.copy(),
+            }
+        return {
+            "inputs": self.inputs,
+            "values": self._get_parameter_values(),
+            "free": self._recipe.getNames(),
+            "jacobian_settings": jacobian_settings,
+            "snapshot_policy": self.snapshot_policy.copy(),
+        }
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.jacobian_settings = state["jacobian_settings"]
+        self.snapshot_policy = state["snapshot_policy"]
+        if state["inputs"] is None:
+            self.inputs = None
+            return
+        key = input_cache.make_key(
+            "adapter", json.dumps(state["inputs"], sort_keys=True, default=str)
+        )
+        template = _unpickled_templates.get(key)
+        if template is None:
+            template = PDFAdapter()
+            template.load_inputs(state["inputs"])
+            _unpickled_templates[key] = template
+            if len(_unpickled_templates) > _MAX_UNPICKLED_TEMPLATES:
+                _unpickled_templates.popitem(last=False)
+        else:
+            _unpickled_templates.move_to_end(key)
+        # The template is never modified, only copied.
+        copied = template.clone()
+        self.inputs = copied.inputs
+        self._recipe = copied._recipe
+        self._initial_values = copied._initial_values
+        self.ready = True
+        self._apply_parameter_values(state["values"])
+        for name in state["free"]:
+            self._recipe.free(name)
+
     def clone(self):
-        """Create a copy of the current PDFAdapter with the same inputs and
-        parameter values."""
+        """Create a copy of the current PDFAdapter with the same inputs,
+        parameter values and fix/free status.
+
+        The recipe is copied in memory instead of being rebuilt from the
+        inputs. The copy owns its parameters, constraints and structure, and
+        shares the arrays of the profile, which are never modified in place,
+        and the process pool with this adapter. If the recipe cannot be
+        copied, the copy is rebuilt from the inputs.
+        """
         adapter = PDFAdapter()
-        adapter.load_inputs(self.inputs)
-        adapter._apply_parameter_values(self._get_parameter_values())
+        adapter.inputs = self.inputs
+        adapter.jacobian_settings = dict(self.jacobian_settings)
+        adapter._jacobian_provider = self._jacobian_provider
+        adapter.snapshot_policy = self.snapshot_policy.copy()
+        adapter.tracer = self.tracer
+        adapter.trace_every = self.trace_every
+        if not self.ready:
+            return adapter
+        memo = {}
+        profile = self._recipe._contributions["pdfcontribution"].profile
+        for array in (
+            profile.xobs,
+            profile.yobs,
+            profile.dyobs,
+            profile.x,
+            profile.y,
+            profile.dy,
+        ):
+            memo[id(array)] = array
+        memo[id(pool_registry)] = pool_registry
+        try:
+            adapter._recipe = copy.deepcopy(self._recipe, memo)
+        except (TypeError, NotImplementedError, pickle.PicklingError):
+            adapter.load_inputs(self.inputs)
+            adapter._apply_parameter_values(self._get_parameter_values())
+            for name in self._recipe.getNames():
+                adapter._recipe.free(name)
+            return adapter
+        adapter._initial_values = self._initial_values
+        adapter.ready = True
         return adapter
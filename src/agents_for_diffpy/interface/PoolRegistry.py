@@ -0,0 +1,121 @@
+import atexit
+import os
+import threading
+import multiprocessing
+
+
+class PoolRegistry:
+    """Process-wide owner of the multiprocessing pool used by the PDF
+    generators.
+
+    Every PDFAdapter used to create its own ``multiprocessing.Pool`` when the
+    recipe was made, so a sequential fit leaked a pool per profile and per
+    cloned adapter. The registry creates a single pool lazily, on the first
+    request, and hands the same pool to every recipe built in this process.
+    The pool is closed when the interpreter exits, or explicitly with
+    ``shutdown``. A child process created by ``fork`` never inherits the
+    parent's pool; it starts over with a fresh, unstarted registry.
+
+    Attributes
+    ----------
+    ncpu : int
+        The number of worker processes of the pool. When not configured,
+        it is estimated from the idle cores once, when first requested.
+        A value of 1 means the PDF calculation runs serially.
+    """
+
+    def __init__(self, ncpu=None):
+        self._ncpu = ncpu
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def ncpu(self):
+        if self._ncpu is None:
+            self._ncpu = self._estimate_ncpu()
+        return self._ncpu
+
+    @staticmethod
+    def _estimate_ncpu():
+        syst_cores = multiprocessing.cpu_count()
+        try:
+            import psutil
+        except ImportError:
+            return syst_cores
+        cpu_percent = psutil.cpu_percent(interval=0.1)
+        avail_cores = int((100 - cpu_percent) / (100.0 / syst_cores))
+        return max(1, avail_cores)
+
+    def configure(self, ncpu=None):
+        """Set the number of worker processes.
+
+        The running pool, if any, is shut down and a new one will be created
+        with the new size the next time it is requested. The recipes created
+        before the call map their calculation with `map`, so they use the
+        new pool, or run serially, but keep splitting it in the number of
+        parts they were built with until they are rebuilt.
+
+        Parameters
+        ----------
+        ncpu : int or None
+            The number of worker processes. None means estimate it from the
+            idle cores.
+        """
+        if ncpu is not None and ncpu < 1:
+            raise ValueError(f"ncpu must be a positive integer, got {ncpu}.")
+        self.shutdown()
+        self._ncpu = ncpu
+
+    def get_pool(self):
+        """Get the shared pool, starting it if necessary.
+
+        Returns
+        -------
+        multiprocessing.pool.Pool or None
+            The shared pool. None if the registry is configured to run with
+            a single process.
+        """
+        if self.ncpu <= 1:
+            return None
+        with self._lock:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(processes=self.ncpu)
+            return self._pool
+
+    def map(self, func, iterable):
+        """Map a function over an iterable with the shared pool, or
+        serially when the registry runs with a single process.
+
+        Unlike the `map` of a pool, it stays valid when the registry is
+        configured again, so it is the map function handed to the PDF
+        generators.
+        """
+        pool = self.get_pool()
+        if pool is None:
+            return list(map(func, iterable))
+        return pool.map(func, iterable)
+
+    @property
+    def started(self):
+        return self._pool is not None
+
+    def shutdown(self):
+        """Close the shared pool and wait for its workers to exit."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def _reset_in_child(self):
+        # The pool belongs to the parent process. Forget it without touching
+        # its workers, and use a new lock in case the fork happened while
+        # the parent held it.
+        self._pool = None
+        self._lock = threading.Lock()
+
+
+pool_registry = PoolRegistry()
+atexit.register(pool_registry.shutdown)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=pool_registry._reset_in_child)
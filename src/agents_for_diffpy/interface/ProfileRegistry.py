@@ -0,0 +1,176 @@
+import bisect
+import json
+from pathlib import Path
+
+
+class ProfileRegistry:
+    """Ordered bookkeeping of the profiles of a sequential fit.
+
+    The profiles are kept sorted by their order, e.g. the temperature
+    extracted from the file name, and are only ever appended: a profile with
+    a lower order than the last known one is rejected. Membership tests use
+    sets, so the cost of an update does not grow with the length of the
+    series.
+
+    When a state file is given, every update is appended to it as a line of
+    JSON, and the registry is restored from it when created. A restarted
+    launcher then knows which profiles were already fitted.
+
+    Attributes
+    ----------
+    state_file : Path or None
+        The file recording the updates. None keeps the registry in memory.
+    """
+
+    def __init__(self, state_file=None):
+        self.state_file = Path(state_file) if state_file else None
+        self._orders = []
+        self._profiles = []
+        # The order of each known profile
+        self._order_of = {}
+        self._finished = []
+        self._finished_set = set()
+        # All the profiles before this position are finished.
+        self._first_pending = 0
+        if self.state_file is not None and self.state_file.exists():
+            self._load()
+
+    def _load(self):
+        with open(self.state_file, "r") as f:
+            lines = f.readlines()
+        for i, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Only the last line can be cut by a crash. It is removed so
+                # that the next update starts on a new line.
+                if i == len(lines) - 1:
+                    with open(self.state_file, "w") as f:
+                        f.writelines(lines[:-1])
+                    break
+                raise
+            if "add" in record:
+                self._add(Path(record["add"]), record["order"])
+            elif "pending" in record:
+                self._mark_pending(Path(record["pending"]))
+            else:
+                self._mark_finished(Path(record["finished"]))
+
+    def _record(self, record):
+        if self.state_file is None:
+            return
+        with open(self.state_file, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+
+    def add(self, profile, order):
+        """Add a profile.
+
+        Parameters
+        ----------
+        profile : Path
+            The profile file.
+        order : int
+            The sort key of the profile.
+
+        Returns
+        -------
+        bool
+            True if the profile is new, False if it was already known.
+        """
+        profile = Path(profile)
+        if profile in self._order_of:
+            return False
+        if self._orders and order < self._orders[-1]:
+            raise ValueError(
+                "Profiles order has changed. "
+                "Please ensure newer profiles are strictly have higher "
+                "indices."
+            )
+        self._add(profile, order)
+        self._record({"add": str(profile), "order": order})
+        return True
+
+    def _add(self, profile, order):
+        index = bisect.bisect_right(self._orders, order)
+        self._orders.insert(index, order)
+        self._profiles.insert(index, profile)
+        self._order_of[profile] = order
+
+    def mark_finished(self, profile):
+        """Mark a profile as fitted."""
+        profile = Path(profile)
+        if profile not in self._order_of:
+            raise KeyError(f"Unknown profile: {profile}")
+        if profile in self._finished_set:
+            return
+        self._mark_finished(profile)
+        self._record({"finished": str(profile)})
+
+    def _mark_finished(self, profile):
+        self._finished.append(profile)
+        self._finished_set.add(profile)
+        while (
+            self._first_pending < len(self._profiles)
+            and self._profiles[self._first_pending] in self._finished_set
+        ):
+            self._first_pending += 1
+
+    def mark_pending(self, profile):
+        """Mark a fitted profile as to be fitted again."""
+        profile = Path(profile)
+        if profile not in self._order_of:
+            raise KeyError(f"Unknown profile: {profile}")
+        if profile not in self._finished_set:
+            return
+        self._mark_pending(profile)
+        self._record({"pending": str(profile)})
+
+    def _mark_pending(self, profile):
+        self._finished.remove(profile)
+        self._finished_set.discard(profile)
+        self._first_pending = min(self._first_pending, self.index(profile))
+
+    def last_finished(self):
+        """Get the profile right before the first pending one, whose result
+        seeds the next fit, or None if the first profile is pending."""
+        if self._first_pending == 0:
+            return None
+        return self._profiles[self._first_pending - 1]
+
+    def is_finished(self, profile):
+        return Path(profile) in self._finished_set
+
+    def pending(self):
+        """Get the profiles that are not fitted yet, in order."""
+        return [
+            profile
+            for profile in self._profiles[self._first_pending :]
+            if profile not in self._finished_set
+        ]
+
+    def index(self, profile):
+        """Get the position of a profile in the series."""
+        profile = Path(profile)
+        if profile not in self._order_of:
+            raise ValueError(f"Unknown profile: {profile}")
+        order = self._order_of[profile]
+        start = bisect.bisect_left(self._orders, order)
+        stop = bisect.bisect_right(self._orders, order)
+        return self._profiles.index(profile, start, stop)
+
+    @property
+    def known(self):
+        """The known profiles, in order."""
+        return list(self._profiles)
+
+    @property
+    def finished(self):
+        """The fitted profiles, in the order they were finished."""
+        return list(self._finished)
+
+    def __contains__(self, profile):
+        return Path(profile) in self._order_of
+
+    def __len__(self):
+        return len(self._profiles)
@@ -0,0 +1,201 @@
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+# inotify constants, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class ProfileWatcher:
+    """Report the new, completely written files of a folder.
+
+    Two backends are available. The "inotify" backend, on Linux, is told by
+    the kernel when a file is closed after writing or moved into the folder,
+    so it neither scans the folder nor uses the CPU while waiting. The "poll"
+    backend scans the folder and reports a new file once its size and
+    modification time did not change between two scans.
+
+    The files present when the watcher is created are reported by `poll`
+    once their size and modification time did not change between two
+    calls, or, with the "inotify" backend, once they are closed after
+    writing. A profile still being written when the watcher starts is
+    therefore not reported half written. The same applies to the files
+    found by the scan of the "inotify" backend when the kernel dropped
+    events.
+
+    Attributes
+    ----------
+    folder : Path
+        The watched folder.
+    pattern : str or None
+        The regular expression the file names must match to be reported.
+        None reports every file.
+    backend : {"inotify", "poll"}
+        The backend in use.
+    """
+
+    def __init__(self, folder, pattern=None, backend="auto"):
+        self._fd = None
+        if backend not in ("auto", "inotify", "poll"):
+            raise ValueError(
+                f"Unknown backend: {backend}. "
+                "Please choose one of {'auto', 'inotify', 'poll'}."
+            )
+        self.folder = Path(folder)
+        self.pattern = pattern
+        self._reported = set()
+        # Size and modification time of the files seen by the last scan
+        self._candidates = {}
+        if backend in ("auto", "inotify"):
+            try:
+                self._fd = self._start_inotify()
+            except OSError:
+                if backend == "inotify":
+                    raise
+        self.backend = "inotify" if self._fd is not None else "poll"
+        # The watch is set before the first scan so no file is missed.
+        if self.backend == "inotify":
+            # Size and modification time of the files not reported yet and
+            # not known to be complete from the events: the files present
+            # at the start, and those found after an overflow
+            self._pending_files = self._scan()
+        else:
+            # The poll backend checks them as any other file.
+            self._pending_files = {}
+            self._candidates = self._scan()
+
+    def _start_inotify(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux.")
+        libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(
+            fd, os.fsencode(self.folder), IN_CLOSE_WRITE | IN_MOVED_TO
+        )
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"Cannot watch {self.folder}")
+        return fd
+
+    def _matches(self, name):
+        return self.pattern is None or re.search(self.pattern, name)
+
+    def _scan(self):
+        files = {}
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and self._matches(entry.name):
+                stat = entry.stat()
+                files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def poll(self, timeout=0.0):
+        """Get the files completed since the last call.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait for a new file, in seconds. The "poll"
+            backend always waits for the whole timeout before scanning the
+            folder. Default is 0, which does not wait.
+
+        Returns
+        -------
+        list of Path
+            The new files, in no particular order.
+        """
+        if self.backend == "inotify":
+            # The files found by the events are checked from the next call.
+            paths = self._check_pending_files()
+            paths.extend(self._read_events(timeout))
+        else:
+            paths = self._poll_folder(timeout)
+        new_files = []
+        for path in paths:
+            if path not in self._reported:
+                self._reported.add(path)
+                self._pending_files.pop(path, None)
+                new_files.append(Path(path))
+        return new_files
+
+    def _check_pending_files(self):
+        """Get the pending files that did not change since the last
+        check."""
+        paths = []
+        for path, stat in list(self._pending_files.items()):
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                del self._pending_files[path]
+                continue
+            current = (current.st_size, current.st_mtime_ns)
+            if current == stat:
+                paths.append(path)
+            else:
+                self._pending_files[path] = current
+        return paths
+
+    def _read_events(self, timeout):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self._fd, 64 * 1024)
+        paths = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, fall back to a scan of the folder. The
+                # files found may still be written, they are checked as
+                # the files present at the start.
+                for path, stat in self._scan().items():
+                    if path not in self._reported:
+                        self._pending_files.setdefault(path, stat)
+                continue
+            name = os.fsdecode(name)
+            if name and self._matches(name):
+                paths.append(os.path.join(self.folder, name))
+        return paths
+
+    def _poll_folder(self, timeout):
+        if timeout:
+            time.sleep(timeout)
+        files = self._scan()
+        # A file is complete once it did not change between two scans.
+        paths = [
+            path
+            for path, stat in files.items()
+            if path not in self._reported
+            and self._candidates.get(path) == stat
+        ]
+        self._candidates = {
+            path: stat
+            for path, stat in files.items()
+            if path not in self._reported
+        }
+        return paths
+
+    def close(self):
+        """Stop watching the folder."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __del__(self):
+        self.close()
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+class ResultCache:
+    """Cache of the payloads computed by the nodes of a DAG.
+
+    A node started from the same inputs and payload, with the same action,
+    the same parameters freed by its ancestors and the same solver settings
+    always ends with the same payload. FitRunner looks the payload up here
+    before running a node, and the node is completed at once on a hit.
+
+    The payloads are kept in memory, and the least recently used ones are
+    evicted once their total size exceeds `max_bytes`. When a directory is
+    given, every payload is also written to it as a JSON file, so the cache
+    survives the process, e.g. when a folder is processed again after a
+    crash. The files least recently written or read are deleted once their
+    total size exceeds `max_disk_bytes`.
+
+    Attributes
+    ----------
+    max_bytes : int
+        The memory bound of the cache, in bytes.
+    directory : Path or None
+        The directory holding the payloads on disk. None keeps the cache in
+        memory.
+    max_disk_bytes : int
+        The size bound of the directory, in bytes.
+    hits : int
+        The number of lookups that found a cached payload.
+    misses : int
+        The number of lookups that did not.
+    """
+
+    def __init__(
+        self, max_bytes=64 * 1024**2, directory=None, max_disk_bytes=1024**3
+    ):
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory is not None else None
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._disk_nbytes = 0
+        self._lock = threading.Lock()
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._disk_nbytes = sum(size for _, _, size in self._list_files())
+
+    @staticmethod
+    def make_key(**parts):
+        """Make a cache key from JSON-serializable parts.
+
+        Returns
+        -------
+        str
+            The hexadecimal digest identifying the parts.
+        """
+        text = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, key):
+        """Get the cached payload for the key.
+
+        Returns
+        -------
+        dict or None
+            A copy of the cached payload, or None on a miss.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(self._entries[key])
+        text = self._read(key)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._insert(key, text)
+        return json.loads(text)
+
+    def put(self, key, payload):
+        """Cache the payload for the key."""
+        text = json.dumps(payload, default=float)
+        with self._lock:
+            self._insert(key, text)
+        self._write(key, text)
+
+    def _insert(self, key, text):
+        if key in self._entries:
+            self._nbytes -= len(self._entries.pop(key))
+        self._entries[key] = text
+        self._nbytes += len(text)
+        # Always keep the newest entry, even if it alone exceeds the bound.
+        while self._nbytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._nbytes -= len(evicted)
+
+    def _read(self, key):
+        if self.directory is None:
+            return None
+        path = self.directory / f"{key}.json"
+        try:
+            text = path.read_text()
+            # Keep the file recently used for the eviction.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return text
+
+    def _write(self, key, text):
+        if self.directory is None:
+            return
+        path = self.directory / f"{key}.json"
+        tmp_path = path.with_name(f"{key}.{os.getpid()}.tmp")
+        tmp_path.write_text(text)
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._disk_nbytes += len(text) - replaced
+            if self._disk_nbytes > self.max_disk_bytes:
+                self._evict_files(keep=path)
+
+    def _list_files(self):
+        """Get the (mtime, path, size) of the payload files."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime_ns, entry.path, stat.st_size))
+        return files
+
+    def _evict_files(self, keep):
+        # The directory may be shared by other processes, so the files are
+        # listed again instead of being tracked.
+        files = sorted(self._list_files())
+        self._disk_nbytes = sum(size for _, _, size in files)
+        for _, path, size in files:
+            if self._disk_nbytes <= self.max_disk_bytes:
+                break
+            if path == str(keep):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._disk_nbytes -= size
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    @property
+    def disk_nbytes(self):
+        return self._disk_nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Remove the entries held in memory and reset the counters. The
+        payloads written to the directory are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,189 @@
+import numbers
+import sqlite3
+import threading
+import numpy
+
+
+class ResultsStore:
+    """Store the results of a sequential fit in a single SQLite file.
+
+    Every parameter value of every node is a row keyed by the profile stem,
+    the position of the node in the topological order of the DAG and the
+    parameter name. The names of the nodes are not unique, e.g. in
+    "a->all->a->all", and are only stored as labels. The rows of the last
+    node of a DAG are flagged as final. Reading one parameter across the
+    whole series, e.g. the lattice parameter against the temperature, is a
+    single indexed query instead of opening one JSON file per profile.
+
+    Only the numeric values of the payloads are stored.
+
+    Attributes
+    ----------
+    path : Path or str
+        The SQLite file. ":memory:" keeps the store in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # The launcher writes from its fitting thread.
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                "stem TEXT PRIMARY KEY, ord REAL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "profile TEXT, node INTEGER, name TEXT, final INTEGER, "
+                "pname TEXT, value REAL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_by_pname "
+                "ON results (pname, final, node)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_by_profile "
+                "ON results (profile, final, node)"
+            )
+
+    def append(self, profile_stem, dag, order=None):
+        """Store the payloads of a completed DAG.
+
+        The results previously stored for the same profile are replaced.
+
+        Parameters
+        ----------
+        profile_stem : str
+            The stem of the profile file.
+        dag : FitDAG
+            The completed DAG.
+        order : float, optional
+            The sort key of the profile, e.g. the temperature. Default is
+            None, which sorts the profile after the stored ones.
+        """
+        topological_order = dag.topological_order
+        rows = []
+        for index, node_id in enumerate(topological_order):
+            node_content = dag.nodes[node_id]
+            payload = node_content["payload"] or {}
+            final = int(index == len(topological_order) - 1)
+            for pname, value in payload.items():
+                if isinstance(value, numbers.Real) and not isinstance(
+                    value, bool
+                ):
+                    rows.append(
+                        (
+                            profile_stem,
+                            index,
+                            node_content["name"],
+                            final,
+                            pname,
+                            float(value),
+                        )
+                    )
+        with self._lock, self._connection:
+            if order is None:
+                (order,) = self._connection.execute(
+                    "SELECT COALESCE(MAX(ord) + 1, 0) FROM profiles"
+                ).fetchone()
+            self._connection.execute(
+                "DELETE FROM results WHERE profile = ?", (profile_stem,)
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO profiles VALUES (?, ?)",
+                (profile_stem, order),
+            )
+            self._connection.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def profiles(self):
+        """Get the stored profile stems, sorted by their order."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT stem FROM profiles ORDER BY ord"
+            ).fetchall()
+        return [stem for (stem,) in rows]
+
+    def __contains__(self, profile_stem):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM profiles WHERE stem = ?", (profile_stem,)
+            ).fetchone()
+        return row is not None
+
+    def column(self, pname, node=None):
+        """Get the values of a parameter across the stored profiles.
+
+        Parameters
+        ----------
+        pname : str
+            The parameter name.
+        node : int, optional
+            The position, in topological order, of the node to read the
+            values from. Default is None, which reads the final values.
+
+        Returns
+        -------
+        orders : numpy.ndarray
+            The orders of the profiles having the parameter, sorted.
+        values : numpy.ndarray
+            The values of the parameter.
+        """
+        query = (
+            "SELECT profiles.ord, results.value FROM results "
+            "JOIN profiles ON profiles.stem = results.profile "
+            "WHERE results.pname = ? AND "
+        )
+        if node is None:
+            query += "results.final = 1"
+            parameters = (pname,)
+        else:
+            query += "results.node = ?"
+            parameters = (pname, node)
+        with self._lock:
+            rows = self._connection.execute(
+                query + " ORDER BY profiles.ord", parameters
+            ).fetchall()
+        data = numpy.array(rows, dtype=float).reshape(-1, 2)
+        return data[:, 0], data[:, 1]
+
+    def payload(self, profile_stem, node=None):
+        """Get the stored payload of a profile.
+
+        Parameters
+        ----------
+        profile_stem : str
+            The stem of the profile file.
+        node : int, optional
+            The position of the node in topological order. Default is None,
+            which gets the final payload.
+
+        Returns
+        -------
+        dict
+            The parameter values.
+
+        Raises
+        ------
+        KeyError
+            If the profile is not stored.
+        """
+        if profile_stem not in self:
+            raise KeyError(f"No results stored for profile {profile_stem}")
+        query = "SELECT pname, value FROM results WHERE profile = ? AND "
+        if node is None:
+            query += "final = 1"
+            parameters = (profile_stem,)
+        else:
+            query += "node = ?"
+            parameters = (profile_stem, node)
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
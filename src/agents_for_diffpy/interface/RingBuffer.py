@@ -0,0 +1,113 @@
+import numpy
+
+
+class RingBuffer:
+    """Fixed-size ring of values stored in a preallocated NumPy array.
+
+    Appending copies the value into the oldest slot once the ring is full,
+    so no memory is allocated after the first append. The values can be
+    scalars or arrays of a fixed shape. When the shape is not given, it is
+    taken from the first appended value, and the ring is cleared and
+    reallocated if a value of a different shape is appended later.
+
+    The slot returned by `append`, `claim` and `latest` is a view into the
+    ring. It is overwritten after `capacity` more appends.
+
+    Attributes
+    ----------
+    capacity : int
+        The maximum number of values kept in the ring.
+    """
+
+    def __init__(self, capacity, shape=None, dtype=float):
+        if capacity < 1:
+            raise ValueError(
+                f"capacity must be a positive integer, got {capacity}."
+            )
+        self.capacity = capacity
+        self.dtype = dtype
+        self._data = None
+        self._next = 0
+        self._size = 0
+        if shape is not None:
+            self._allocate(tuple(shape))
+
+    def _allocate(self, shape):
+        self._data = numpy.empty((self.capacity, *shape), dtype=self.dtype)
+        self._next = 0
+        self._size = 0
+
+    @property
+    def shape(self):
+        return None if self._data is None else self._data.shape[1:]
+
+    def append(self, value):
+        """Copy a value into the ring.
+
+        Parameters
+        ----------
+        value : scalar or array_like
+            The value to store.
+
+        Returns
+        -------
+        numpy.ndarray
+            The slot holding the value.
+        """
+        value = numpy.asarray(value)
+        index = self._advance(value.shape)
+        self._data[index] = value
+        return self._data[index]
+
+    def claim(self, shape):
+        """Take the next slot, to be written in place, e.g. as the `out`
+        argument of a NumPy function.
+
+        Parameters
+        ----------
+        shape : tuple of int
+            The shape of the value.
+
+        Returns
+        -------
+        numpy.ndarray
+            The slot. Its content is undefined until it is written.
+        """
+        index = self._advance(tuple(shape))
+        return self._data[index]
+
+    def _advance(self, shape):
+        if self._data is None or shape != self.shape:
+            self._allocate(shape)
+        index = self._next
+        self._next = (index + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        return index
+
+    def extend(self, values):
+        """Copy several values into the ring, oldest first."""
+        for value in values:
+            self.append(value)
+
+    def latest(self):
+        """Get the slot holding the most recent value, or None if the ring
+        is empty."""
+        if self._size == 0:
+            return None
+        return self._data[(self._next - 1) % self.capacity]
+
+    def to_array(self):
+        """Get a copy of the stored values, from the oldest to the most
+        recent."""
+        if self._size == 0:
+            return numpy.empty((0, *(self.shape or ())), dtype=self.dtype)
+        start = (self._next - self._size) % self.capacity
+        indices = (start + numpy.arange(self._size)) % self.capacity
+        return self._data[indices]
+
+    def clear(self):
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
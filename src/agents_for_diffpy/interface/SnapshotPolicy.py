@@ -0,0 +1,87 @@
+import time
+import numpy
+
+
+class SnapshotPolicy:
+    """Decide which residual evaluations are captured as snapshots.
+
+    Attributes
+    ----------
+    mode : {"always", "off", "every", "interval", "improve"}
+        "always" captures every evaluation, "off" captures none, "every"
+        captures every `every`-th evaluation, "interval" captures at most
+        once every `interval_ms` milliseconds, and "improve" captures only
+        the evaluations that lower the chi-squared.
+    every : int
+        The capture period, in evaluations, of the "every" mode.
+    interval_ms : float
+        The minimum time between two captures of the "interval" mode.
+    capacity : int
+        The number of snapshots kept for each profile.
+    """
+
+    modes = ("always", "off", "every", "interval", "improve")
+
+    def __init__(self, mode="always", every=1, interval_ms=100.0, capacity=8):
+        if mode not in self.modes:
+            raise ValueError(
+                f"Unknown snapshot mode: {mode}. "
+                f"Please choose one of {self.modes}."
+            )
+        if every < 1:
+            raise ValueError(f"every must be a positive integer, got {every}.")
+        self.mode = mode
+        self.every = every
+        self.interval_ms = interval_ms
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        """Forget the evaluations seen so far."""
+        self._count = 0
+        self._last_time = None
+        self._best_chi2 = numpy.inf
+
+    def should_capture(self, chiv):
+        """Check whether the current evaluation should be captured.
+
+        Parameters
+        ----------
+        chiv : numpy.ndarray
+            The residual vector of the evaluation.
+
+        Returns
+        -------
+        bool
+            True if the evaluation should be captured.
+        """
+        self._count += 1
+        if self.mode == "always":
+            return True
+        if self.mode == "off":
+            return False
+        if self.mode == "every":
+            return (self._count - 1) % self.every == 0
+        if self.mode == "interval":
+            now = time.perf_counter()
+            if (
+                self._last_time is not None
+                and (now - self._last_time) * 1000 < self.interval_ms
+            ):
+                return False
+            self._last_time = now
+            return True
+        chi2 = numpy.dot(chiv, chiv)
+        if chi2 < self._best_chi2:
+            self._best_chi2 = chi2
+            return True
+        return False
+
+    def copy(self):
+        """Get a new policy with the same settings and no history."""
+        return SnapshotPolicy(
+            mode=self.mode,
+            every=self.every,
+            interval_ms=self.interval_ms,
+            capacity=self.capacity,
+        )
@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Tracer:
+    """Record the timeline of a fit as trace events.
+
+    Every span is a complete ("X") event of the Chrome trace event format,
+    with its process and thread. The file written by `write` can be opened
+    in chrome://tracing or https://ui.perfetto.dev, which show one lane per
+    thread and per worker process.
+
+    The timestamps are read from the system clock, so the spans measured in
+    worker processes line up with the ones of the main process.
+
+    For long sessions, `flush` appends the recorded spans to a file and
+    drops them from memory. At most `max_events` spans are kept in memory
+    between two flushes, the oldest ones are dropped first.
+
+    Attributes
+    ----------
+    pid : int
+        The ID of the process recording the trace.
+    max_events : int or None
+        The maximum number of spans kept in memory. None keeps them all.
+    """
+
+    def __init__(self, max_events=100000):
+        self.pid = os.getpid()
+        self.max_events = max_events
+        self._events = deque(maxlen=max_events)
+        # The names of the lanes, keyed by (pid, tid)
+        self._thread_names = {}
+        self._lock = threading.Lock()
+        # The file appended by flush, and the lanes already named in it
+        self._flush_file = None
+        self._flushed_lanes = set()
+
+    @staticmethod
+    def now():
+        """Get the current time, in seconds, as used by `add_span`."""
+        return time.time()
+
+    def add_span(
+        self,
+        name,
+        start,
+        end,
+        category="runner",
+        args=None,
+        pid=None,
+        tid=None,
+    ):
+        """Record a span.
+
+        Parameters
+        ----------
+        name : str
+            The name shown on the span.
+        start, end : float
+            The start and end times, in seconds, from `now`.
+        category : str, optional
+            The category of the span. Default is "runner".
+        args : dict, optional
+            JSON-serializable details shown with the span.
+        pid, tid : int, optional
+            The process and thread the span happened in. Default is None,
+            which uses the calling thread of this process.
+        """
+        if pid is None:
+            pid = self.pid
+        if tid is None:
+            thread = threading.current_thread()
+            tid = thread.ident
+            thread_name = thread.name
+        else:
+            thread_name = f"worker {pid}" if pid != self.pid else str(tid)
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start * 1e6,
+            "dur": max(end - start, 0.0) * 1e6,
+            "pid": pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+            self._thread_names.setdefault((pid, tid), thread_name)
+
+    @contextmanager
+    def span(self, name, category="runner", **args):
+        """Record the time spent in a `with` block as a span."""
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, self.now(), category, args)
+
+    @staticmethod
+    def _get_metadata(thread_names):
+        return [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": thread_name},
+            }
+            for (pid, tid), thread_name in thread_names.items()
+        ]
+
+    def write(self, filename="trace.json"):
+        """Write the recorded spans to a trace file."""
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+        with open(filename, "w") as f:
+            json.dump(
+                {
+                    "traceEvents": self._get_metadata(thread_names) + events,
+                    "displayTimeUnit": "ms",
+                },
+                f,
+            )
+
+    def flush(self, filename="trace.json"):
+        """Append the spans recorded since the last flush to a trace file,
+        and drop them from memory.
+
+        The file is written in the JSON array format of the trace event
+        format, whose closing bracket is optional, so it can be opened at
+        any time. It is created by the first flush to it, and started again
+        if another file was flushed to last.
+        """
+        filename = Path(filename)
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            if filename != self._flush_file:
+                self._flush_file = filename
+                self._flushed_lanes = set()
+                mode = "w"
+            else:
+                mode = "a"
+            thread_names = {
+                lane: thread_name
+                for lane, thread_name in self._thread_names.items()
+                if lane not in self._flushed_lanes
+            }
+            self._flushed_lanes.update(thread_names)
+            with open(filename, mode) as f:
+                if mode == "w":
+                    f.write("[\n")
+                for event in self._get_metadata(thread_names) + events:
+                    f.write(json.dumps(event) + ",\n")
+
+    def __len__(self):
+        return len(self._events)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+            self._thread_names.clear()
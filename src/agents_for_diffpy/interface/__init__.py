@@ -1,5 +1,40 @@
-__all__ = ["FitDAG", "FitRunner", "PDFAdapter", "FitPlotter"]
+__all__ = [
+    "FitDAG",
+    "FitRunner",
+    "PDFAdapter",
+    "FitPlotter",
+    "PoolRegistry",
+    "pool_registry",
+    "InputCache",
+    "input_cache",
+    "JacobianProvider",
+    "RingBuffer",
+    "SnapshotPolicy",
+    "DataChannel",
+    "ProfileWatcher",
+    "ProfileRegistry",
+    "ResultsStore",
+    "ResultCache",
+    "Tracer",
+]
 from agents_for_diffpy.interface.FitDAG import FitDAG
 from agents_for_diffpy.interface.FitRunner import FitRunner
 from agents_for_diffpy.interface.PDFAdapter import PDFAdapter
 from agents_for_diffpy.interface.FitPlotter import FitPlotter
+from agents_for_diffpy.interface.PoolRegistry import (
+    PoolRegistry,
+    pool_registry,
+)
+from agents_for_diffpy.interface.InputCache import (
+    InputCache,
+    input_cache,
+)
+from agents_for_diffpy.interface.JacobianProvider import JacobianProvider
+from agents_for_diffpy.interface.RingBuffer import RingBuffer
+from agents_for_diffpy.interface.SnapshotPolicy import SnapshotPolicy
+from agents_for_diffpy.interface.DataChannel import DataChannel
+from agents_for_diffpy.interface.ProfileWatcher import ProfileWatcher
+from agents_for_diffpy.interface.ProfileRegistry import ProfileRegistry
+from agents_for_diffpy.interface.ResultsStore import ResultsStore
+from agents_for_diffpy.interface.ResultCache import ResultCache
+from agents_for_diffpy.interface.Tracer import Tracer
@@ -0,0 +1,37 @@
+import queue
+import threading
+import unittest
+from agents_for_diffpy.interface import DataChannel
+
+
+class TestDataChannel(unittest.TestCase):
+    def test_put(self):
+        # C1: Put three items into a "latest" channel.
+        #  Expect only the last item to be kept and two items to be dropped.
+        channel = DataChannel(policy="latest")
+        for item in range(3):
+            channel.put(item)
+        self.assertEqual(channel.drain(), [2])
+        self.assertEqual(channel.dropped, 2)
+        # C2: Put three items into a "drop_oldest" channel of capacity 2.
+        #  Expect the two most recent items to be kept.
+        channel = DataChannel(capacity=2, policy="drop_oldest")
+        for item in range(3):
+            channel.put(item)
+        self.assertEqual(channel.get(), 1)
+        self.assertEqual(channel.get_nowait(), 2)
+        self.assertEqual(channel.dropped, 1)
+        with self.assertRaises(queue.Empty):
+            channel.get_nowait()
+        # C3: Put an item into a full "block" channel.
+        #  Expect the producer to wait until an item is consumed.
+        channel = DataChannel(capacity=1, policy="block")
+        channel.put(0)
+        with self.assertRaises(queue.Full):
+            channel.put(1, timeout=0.01)
+        consumer = threading.Timer(0.05, channel.get)
+        consumer.start()
+        channel.put(1, timeout=5)
+        consumer.join()
+        self.assertEqual(channel.drain(), [1])
+        self.assertEqual(channel.dropped, 0)
@@ -56,9 +56,19 @@ class TestFitDAG(unittest.TestCase):
         for node_id in dag_from_str.nodes():
             dag_from_str.nodes[node_id]["payload"] = {"pname": 0}
         # C1: with_payload=True, with_same_id=True
-        #  Expect copied_dag = original_dag
+        #  Expect copied_dag = original_dag except for the buffers, and
+        #  the original_dag to be untouched
         copied_dag = dag_from_str.copy(with_payload=True, with_same_id=True)
-        self.assertTrue(nx.utils.graphs_equal(dag_from_str, copied_dag))
+        for node_id in dag_from_str.nodes():
+            original_node = dag_from_str.nodes[node_id]
+            copied_node = copied_dag.nodes[node_id]
+            self.assertEqual(original_node["buffer"], {})
+            self.assertEqual(original_node["payload"], {"pname": 0})
+            self.assertIsNone(copied_node["buffer"])
+            self.assertEqual(
+                {**original_node, "buffer": None}, dict(copied_node)
+            )
+        self.assertEqual(list(dag_from_str.edges), list(copied_dag.edges))
         # C2: with_payload=False, with_same_id=True
         #  Expect copied_dag to have the same node_ids, same structure,
         #  but payloads should be None
@@ -76,3 +86,140 @@ class TestFitDAG(unittest.TestCase):
         for node_id in copied_dag.nodes():
             self.assertTrue(copied_dag.nodes[node_id]["payload"] is None)
         self.assertTrue(nx.is_isomorphic(dag_from_str, copied_dag))
+        # C4: instantiate
+        #  Expect the same result as C3, with the actions shared with the
+        #  untouched original_dag
+        instance = dag_from_str.instantiate()
+        self.assertIsInstance(instance, FitDAG)
+        self.assertTrue(nx.is_isomorphic(dag_from_str, instance))
+        for node_id in dag_from_str.nodes():
+            self.assertEqual(
+                dag_from_str.nodes[node_id]["payload"], {"pname": 0}
+            )
+            self.assertIs(
+                dag_from_str.nodes[node_id]["action"],
+                instance.nodes[
+                    instance.name_to_id[dag_from_str.nodes[node_id]["name"]]
+                ]["action"],
+            )
+        for node_id in instance.nodes():
+            self.assertTrue(node_id not in dag_from_str.nodes)
+            self.assertIsNone(instance.nodes[node_id]["payload"])
+            self.assertIsNone(instance.nodes[node_id]["buffer"])
+
+    def test_node_signatures(self):
+        dag = FitDAG()
+        dag.from_str("a->scale->delta2->all")
+        signatures = dag.node_signatures(seed="inputs")
+        # C1: Get the signatures of a DAG with an appended node.
+        #  Expect the signatures of the original nodes to be unchanged.
+        appended_dag = FitDAG()
+        appended_dag.from_str("a->scale->delta2->all->qdamp")
+        appended_signatures = appended_dag.node_signatures(seed="inputs")
+        kept_signatures = [
+            signature
+            for node_id, signature in appended_signatures.items()
+            if appended_dag.nodes[node_id]["name"] != "qdamp"
+        ]
+        self.assertEqual(sorted(signatures.values()), sorted(kept_signatures))
+        # C2: Get the signatures of a DAG with a changed node.
+        #  Expect only the signatures upstream of the change to be kept.
+        changed_dag = FitDAG()
+        changed_dag.from_str("a->scale->Uiso->all")
+        changed_signatures = set(
+            changed_dag.node_signatures(seed="inputs").values()
+        )
+        kept = [
+            dag.nodes[node_id]["name"]
+            for node_id, signature in signatures.items()
+            if signature in changed_signatures
+        ]
+        self.assertEqual(sorted(kept), ["a", "scale"])
+        # C3: Get the signatures with another seed.
+        #  Expect every signature to change.
+        other_signatures = set(dag.node_signatures(seed="other").values())
+        self.assertFalse(other_signatures & set(signatures.values()))
+
+    def test_topology(self):
+        dag = FitDAG()
+        dag.from_str("a->scale->all")
+        root_id, leaf_id = dag.name_to_id["a"], dag.name_to_id["all"]
+        # C1: Query the topology twice.
+        #  Expect the same order, computed once.
+        order = dag.topological_order
+        self.assertIs(dag.topological_order, order)
+        self.assertEqual(order[0], root_id)
+        self.assertEqual(order[-1], leaf_id)
+        # C2: Append a node.
+        #  Expect the leaf nodes, the order and the name index to be updated.
+        dag.add_node("new", **dag.furnish_node_dict({"action": ["delta2"]}))
+        dag.add_edge(leaf_id, "new")
+        self.assertEqual(dag.leaf_nodes, ["new"])
+        self.assertEqual(dag.topological_order[-1], "new")
+        self.assertEqual(dag.name_to_id["delta2"], "new")
+        # C3: Remove the root node.
+        #  Expect the root nodes to be updated.
+        dag.remove_node(root_id)
+        self.assertEqual(dag.root_nodes, [dag.name_to_id["scale"]])
+        # C4: Clear the DAG.
+        #  Expect no node to be left in the views.
+        dag.clear()
+        self.assertEqual(dag.root_nodes, [])
+        self.assertEqual(dag.name_to_id, {})
+
+    def test_binary(self):
+        dag = FitDAG()
+        dag.from_str("a->scale->delta2->all")
+        for i, node_id in enumerate(dag.topological_order):
+            dag.nodes[node_id]["payload"] = {"a": 3.5 + i, "scale": 0.4}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for compress in (True, False):
+                filename = Path(tmpdir) / f"graph_{compress}.fitdag"
+                dag.to_binary(filename, compress=compress)
+                # C1: Save and load the DAG.
+                #  Expect the same nodes, edges and payloads.
+                loaded_dag = FitDAG()
+                loaded_dag.from_binary(filename)
+                self.assertEqual(list(loaded_dag.edges), list(dag.edges))
+                for node_id in dag.nodes:
+                    self.assertEqual(
+                        dict(loaded_dag.nodes[node_id]),
+                        {**dag.nodes[node_id], "buffer": None},
+                    )
+                # C2: Read the topology only.
+                #  Expect the same structure without payloads.
+                topology = FitDAG.read_binary_topology(filename)
+                self.assertEqual(list(topology.edges), list(dag.edges))
+                for node_id in topology.nodes:
+                    self.assertIsNone(topology.nodes[node_id]["payload"])
+                # C3: Read the final payload only.
+                #  Expect the payload of the last node.
+                self.assertEqual(
+                    FitDAG.read_binary_payload(filename),
+                    dag.nodes[dag.topological_order[-1]]["payload"],
+                )
+            # C4: Save and load a DAG with integer node IDs.
+            #  Expect the payloads found by their IDs.
+            int_dag = FitDAG()
+            for node_id in (0, 1):
+                int_dag.add_node(
+                    node_id,
+                    **{**int_dag.default_node, "id": node_id, "name": "a"},
+                )
+                int_dag.nodes[node_id]["payload"] = {"a": 3.5 + node_id}
+            int_dag.add_edge(0, 1)
+            filename = Path(tmpdir) / "int.fitdag"
+            int_dag.to_binary(filename)
+            loaded_dag = FitDAG()
+            loaded_dag.from_binary(filename)
+            self.assertEqual(loaded_dag.nodes[0]["payload"], {"a": 3.5})
+            self.assertEqual(
+                FitDAG.read_binary_payload(filename, 0), {"a": 3.5}
+            )
+            self.assertEqual(FitDAG.read_binary_payload(filename), {"a": 4.5})
+            # C5: Load a file which is not in the binary format.
+            #  Expect ValueError.
+            filename = Path(tmpdir) / "graph.json"
+            dag.to_json(filename)
+            with self.assertRaises(ValueError):
+                FitDAG().from_binary(filename)
@@ -0,0 +1,42 @@
+import unittest
+import numpy
+from agents_for_diffpy.interface.FitPlotter import _minmax_decimate
+
+
+class TestMinmaxDecimate(unittest.TestCase):
+    def test_short_curve(self):
+        # C1: Reduce a curve with fewer points than bins.
+        #  Expect the curve to be returned as is.
+        y = numpy.array([3.0, 1.0, 2.0])
+        x, reduced = _minmax_decimate(y, 10)
+        self.assertTrue(numpy.array_equal(x, [0, 1, 2]))
+        self.assertIs(reduced, y)
+        # C2: Reduce a curve with exactly two points per bin.
+        #  Expect the curve to be returned as is.
+        y = numpy.arange(20.0)
+        _, reduced = _minmax_decimate(y, 10)
+        self.assertIs(reduced, y)
+        # C3: Reduce a curve to no bin.
+        #  Expect the curve to be returned as is.
+        _, reduced = _minmax_decimate(y, 0)
+        self.assertIs(reduced, y)
+
+    def test_uneven_bins(self):
+        # C1: Reduce 10 points to 3 bins.
+        #  Expect the minimum and maximum of the bins [0, 3), [3, 6) and
+        #  [6, 10), at their centers.
+        y = numpy.array([5.0, 1.0, 3.0, 0.0, 9.0, 4.0, 7.0, 2.0, 8.0, 6.0])
+        x, reduced = _minmax_decimate(y, 3)
+        self.assertTrue(
+            numpy.array_equal(reduced, [1.0, 5.0, 0.0, 9.0, 2.0, 8.0])
+        )
+        self.assertTrue(numpy.array_equal(x, [1, 1, 4, 4, 7.5, 7.5]))
+
+    def test_nan(self):
+        # C1: Reduce a curve with a NaN in a bin and a bin of NaNs.
+        #  Expect the NaN to be ignored in the first bin, and NaNs for the
+        #  second one.
+        y = numpy.array([1.0, numpy.nan, 3.0, numpy.nan, numpy.nan, numpy.nan])
+        _, reduced = _minmax_decimate(y, 2)
+        self.assertTrue(numpy.array_equal(reduced[:2], [1.0, 3.0]))
+        self.assertTrue(numpy.isnan(reduced[2:]).all())
@@ -1,8 +1,17 @@
+import asyncio
+import json
 import sys
+import tempfile
 from pathlib import Path
 import unittest
 from scipy.optimize import least_squares
-from agents_for_diffpy.interface import FitDAG, FitRunner, PDFAdapter
+from agents_for_diffpy.interface import (
+    FitDAG,
+    FitRunner,
+    PDFAdapter,
+    ResultCache,
+    Tracer,
+)
 
 sys.path.append(str(Path(__file__).parent / "diffpycmi_scripts.py"))
 from diffpycmi_scripts import make_recipe  # noqa: E402
@@ -133,3 +142,409 @@ class TestFitRunner(unittest.TestCase):
         self.runner.mark(node_id, "completed")
         self.assertFalse(self.runner.is_marked(node_id, "initialized"))
         self.assertTrue(self.runner.is_marked(node_id, "completed"))
+
+    def test_concurrency(self):
+        # C1: Run a DAG with two branches with and without worker processes.
+        #  Expect the same payloads at every node.
+        dag_dict = {
+            "nodes": [
+                {"id": "1", "action": "a"},
+                {"id": "2", "action": "scale"},
+                {"id": "3", "action": "Uiso_0"},
+            ],
+            "edges": [
+                {"source": "1", "target": "2"},
+                {"source": "1", "target": "3"},
+            ],
+        }
+        serial_dag, parallel_dag = FitDAG(), FitDAG()
+        serial_dag.from_dict(dag_dict)
+        parallel_dag.from_dict(dag_dict)
+        self.runner._run_dag(serial_dag, PDFAdapter, self.inputs, self.payload)
+        runner = FitRunner()
+        runner.set_concurrency(2)
+        runner._run_dag(parallel_dag, PDFAdapter, self.inputs, self.payload)
+        runner.shutdown()
+        for node_id in ["1", "2", "3"]:
+            serial_payload = serial_dag.nodes[node_id]["payload"]
+            parallel_payload = parallel_dag.nodes[node_id]["payload"]
+            for pname, pvalue in serial_payload.items():
+                self.assertAlmostEqual(pvalue, parallel_payload[pname])
+        # C2: Watch the snapshots of the nodes run in worker processes.
+        #  Expect one calculated profile for each node.
+        runner = FitRunner()
+        runner.set_concurrency(2)
+        window_id = runner.watch(
+            lambda dag, node_id: True,
+            pname="ycalc_0",
+            update_mode="append",
+            source="adapter",
+        )
+        parallel_dag = FitDAG()
+        parallel_dag.from_dict(dag_dict)
+        runner._run_dag(parallel_dag, PDFAdapter, self.inputs, self.payload)
+        runner.shutdown()
+        self.assertEqual(
+            len(runner.data_for_plot[window_id]["ydata"].drain()), 3
+        )
+        # C3: Get the metrics of the nodes run in worker processes.
+        #  Expect the synchronization of the local adapter, and its residual
+        #  evaluation, to be counted.
+        for node_id in ["2", "3"]:
+            metrics = parallel_dag.nodes[node_id]["metrics"]
+            self.assertEqual(metrics["source"], "worker")
+            self.assertGreaterEqual(metrics["wall_time"], metrics["sync_time"])
+            self.assertGreater(metrics["neval"], metrics["nfev"])
+
+    def test_run_async(self):
+        # C1: Run two DAGs on the same event loop.
+        #  Expect both DAGs to be completed, the completion event of the leaf
+        #  node to be set, and the results to match the blocking run.
+        other_dag = FitDAG()
+        other_dag.from_str("a->scale->qdamp->Uiso_0->delta2->all")
+        leaf_id = self.dag.leaf_nodes[0]
+
+        async def run():
+            await asyncio.gather(
+                self.runner.run_dag_async(
+                    self.dag, PDFAdapter, self.inputs, self.payload
+                ),
+                self.runner.run_dag_async(
+                    other_dag, PDFAdapter, self.inputs, self.payload
+                ),
+                self.runner.wait_for_node(leaf_id),
+            )
+
+        asyncio.run(run())
+        expected_dag = FitDAG()
+        expected_dag.from_str("a->scale->qdamp->Uiso_0->delta2->all")
+        FitRunner()._run_dag(
+            expected_dag, PDFAdapter, self.inputs, self.payload
+        )
+        expected = expected_dag.nodes[expected_dag.leaf_nodes[0]]["payload"]
+        for dag in (self.dag, other_dag):
+            payload = dag.nodes[dag.leaf_nodes[0]]["payload"]
+            for pname, pvalue in expected.items():
+                self.assertAlmostEqual(pvalue, payload[pname], places=6)
+        # C2: Run the DAG again on a new event loop, and wait for a node
+        #  after the run.
+        #  Expect the run to complete, the wait to return at once, and no
+        #  completion event to be kept.
+
+        async def run_again():
+            await self.runner.run_dag_async(
+                self.dag, PDFAdapter, self.inputs, self.payload
+            )
+            await self.runner.wait_for_node(leaf_id)
+
+        asyncio.run(run_again())
+        self.assertTrue(self.runner.is_marked(leaf_id, "completed"))
+        for events in self.runner.node_events.values():
+            self.assertEqual(events, {})
+        # C3: Run two DAGs with different starting payloads at the same
+        #  time, with a checkpoint.
+        #  Expect each DAG to keep its own inputs hash, the checkpoint to
+        #  hold the hash of the DAG its nodes belong to, and no temporary
+        #  file to be left.
+        other_payload = dict(self.payload, scale=0.5)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            checkpoint_path = Path(tmpdir) / "checkpoint.json"
+            self.runner.set_checkpoint(checkpoint_path)
+
+            async def run_both():
+                await asyncio.gather(
+                    self.runner.run_dag_async(
+                        self.dag, PDFAdapter, self.inputs, self.payload
+                    ),
+                    self.runner.run_dag_async(
+                        other_dag, PDFAdapter, self.inputs, other_payload
+                    ),
+                )
+
+            asyncio.run(run_both())
+            self.runner.set_checkpoint(None)
+            checkpoint = json.loads(checkpoint_path.read_text())
+            self.assertEqual(list(Path(tmpdir).iterdir()), [checkpoint_path])
+        self.assertNotEqual(
+            self.dag.graph["inputs_hash"], other_dag.graph["inputs_hash"]
+        )
+        (dag,) = [
+            dag
+            for dag in (self.dag, other_dag)
+            if dag.graph["inputs_hash"] == checkpoint["inputs_hash"]
+        ]
+        self.assertTrue(set(checkpoint["nodes"]) <= set(dag.nodes))
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            checkpoint_path = Path(tmpdir) / "checkpoint.json"
+            self.runner.set_checkpoint(checkpoint_path)
+            self.runner._run_dag(
+                self.dag, PDFAdapter, self.inputs, self.payload
+            )
+            # C1: Run a DAG with checkpointing.
+            #  Expect the 6 completed nodes to be saved.
+            checkpoint = json.loads(checkpoint_path.read_text())
+            self.assertEqual(len(checkpoint["nodes"]), 6)
+            # C2: Resume a DAG with new node IDs from a checkpoint holding
+            #  the first 3 nodes.
+            #  Expect the saved payloads to be reused and the final result
+            #  to match the uninterrupted run.
+            node_ids = list(checkpoint["nodes"])[:3]
+            checkpoint["nodes"] = {
+                node_id: checkpoint["nodes"][node_id] for node_id in node_ids
+            }
+            checkpoint_path.write_text(json.dumps(checkpoint))
+            dag = FitDAG()
+            dag.from_str("a->scale->qdamp->Uiso_0->delta2->all")
+            completed = self.runner.load_checkpoint(
+                dag, self.inputs, self.payload
+            )
+            self.assertEqual(len(completed), 3)
+            self.runner.resume_dag(dag, PDFAdapter, self.inputs, self.payload)
+            for node_id in node_ids:
+                name = self.dag.nodes[node_id]["name"]
+                self.assertEqual(
+                    dag.nodes[dag.name_to_id[name]]["payload"],
+                    checkpoint["nodes"][node_id]["payload"],
+                )
+            expected = self.dag.nodes[self.dag.leaf_nodes[0]]["payload"]
+            payload = dag.nodes[dag.leaf_nodes[0]]["payload"]
+            for pname, pvalue in expected.items():
+                self.assertAlmostEqual(pvalue, payload[pname], places=6)
+            # C3: Load the checkpoint for other inputs.
+            #  Expect the checkpoint to be ignored.
+            other_inputs = {**self.inputs, "xmax": 40}
+            self.assertEqual(
+                self.runner.load_checkpoint(dag, other_inputs, self.payload),
+                {},
+            )
+
+    def test_result_cache(self):
+        self.runner.set_result_cache(ResultCache())
+        self.runner._run_dag(self.dag, PDFAdapter, self.inputs, self.payload)
+        # C1: Run the same DAG again with the same cache.
+        #  Expect every node to be found in the cache, with the same
+        #  payloads.
+        dag = FitDAG()
+        dag.from_str("a->scale->qdamp->Uiso_0->delta2->all")
+        self.runner._run_dag(dag, PDFAdapter, self.inputs, self.payload)
+        self.assertEqual(self.runner.result_cache.hits, 6)
+        self.assertEqual(
+            dag.nodes[dag.leaf_nodes[0]]["payload"],
+            self.dag.nodes[self.dag.leaf_nodes[0]]["payload"],
+        )
+        # C2: Run the DAG from another payload.
+        #  Expect no node to be found in the cache.
+        dag = FitDAG()
+        dag.from_str("a->scale->qdamp->Uiso_0->delta2->all")
+        self.runner._run_dag(
+            dag, PDFAdapter, self.inputs, {**self.payload, "a": 3.53}
+        )
+        self.assertEqual(self.runner.result_cache.hits, 6)
+        # C3: Watch the snapshots of the nodes found in the cache.
+        #  Expect one calculated profile for each node.
+        window_id = self.runner.watch(
+            lambda dag, node_id: True,
+            pname="ycalc_0",
+            update_mode="append",
+            source="adapter",
+        )
+        dag = FitDAG()
+        dag.from_str("a->scale->qdamp->Uiso_0->delta2->all")
+        self.runner._run_dag(dag, PDFAdapter, self.inputs, self.payload)
+        self.assertEqual(self.runner.result_cache.hits, 12)
+        self.assertEqual(
+            len(self.runner.data_for_plot[window_id]["ydata"].drain()), 6
+        )
+
+    def test_rerun(self):
+        self.runner._run_dag(self.dag, PDFAdapter, self.inputs, self.payload)
+        # C1: Rerun the DAG with a node appended after "all".
+        #  Expect the payloads of the original nodes to be reused.
+        dag = FitDAG()
+        dag.from_str("a->scale->qdamp->Uiso_0->delta2->all->qbroad")
+        self.runner.rerun_dag(
+            dag, self.dag, PDFAdapter, self.inputs, self.payload
+        )
+        for node_id in self.dag.nodes:
+            name = self.dag.nodes[node_id]["name"]
+            self.assertIs(
+                dag.nodes[dag.name_to_id[name]]["payload"],
+                self.dag.nodes[node_id]["payload"],
+            )
+        self.assertIsNotNone(dag.nodes[dag.leaf_nodes[0]]["payload"])
+        # C2: Rerun the DAG from another payload.
+        #  Expect no payload to be reused.
+        dag = FitDAG()
+        dag.from_str("a->scale->qdamp->Uiso_0->delta2->all")
+        self.runner.rerun_dag(
+            dag,
+            self.dag,
+            PDFAdapter,
+            self.inputs,
+            {**self.payload, "a": 3.53},
+        )
+        for node_id in dag.nodes:
+            name = dag.nodes[node_id]["name"]
+            self.assertIsNot(
+                dag.nodes[node_id]["payload"],
+                self.dag.nodes[self.dag.name_to_id[name]]["payload"],
+            )
+        # C3: Rerun the DAG after a previous run interrupted after 3 nodes.
+        #  Expect the 3 completed nodes to be reused and the others to be
+        #  run.
+        previous_dag = self.dag.copy(with_payload=True, return_type="FitDAG")
+        for node_id in previous_dag.topological_order[3:]:
+            previous_dag.nodes[node_id]["payload"] = {}
+            previous_dag.nodes[node_id]["metrics"] = {}
+        dag = FitDAG()
+        dag.from_str("a->scale->qdamp->Uiso_0->delta2->all")
+        self.runner.rerun_dag(
+            dag, previous_dag, PDFAdapter, self.inputs, self.payload
+        )
+        self.assertEqual(
+            self.runner.get_metrics(dag)["sources"], {"completed": 3, "run": 3}
+        )
+        self.assertTrue(dag.nodes[dag.leaf_nodes[0]]["payload"])
+
+    def test_metrics(self):
+        self.runner._run_dag(self.dag, PDFAdapter, self.inputs, self.payload)
+        # C1: Get the metrics of a completed DAG.
+        #  Expect the 6 nodes to be run, with their evaluations counted,
+        #  including the finite differences, and their times summed.
+        metrics = self.runner.get_metrics(self.dag)
+        self.assertEqual(metrics["sources"], {"run": 6})
+        self.assertEqual(
+            [node["name"] for node in metrics["nodes"]],
+            ["a", "scale", "qdamp", "Uiso_0", "delta2", "all"],
+        )
+        for node in metrics["nodes"]:
+            self.assertGreater(node["nfev"], 0)
+            self.assertGreater(node["neval"], node["nfev"])
+            self.assertGreaterEqual(
+                node["wall_time"], node["least_squares_time"]
+            )
+        self.assertEqual(
+            metrics["total"]["nfev"],
+            sum(node["nfev"] for node in metrics["nodes"]),
+        )
+        self.assertGreaterEqual(
+            metrics["wall_time"], metrics["total"]["least_squares_time"]
+        )
+        # C2: Save and load the DAG.
+        #  Expect the metrics to be kept.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = Path(tmpdir) / "dag.json"
+            self.dag.to_json(filename)
+            dag = FitDAG()
+            dag.from_json(filename)
+        for node_id in self.dag.nodes:
+            self.assertEqual(
+                dag.nodes[node_id]["metrics"],
+                self.dag.nodes[node_id]["metrics"],
+            )
+
+    def test_trace(self):
+        tracer = Tracer()
+        self.runner.set_tracer(tracer, residual_every=10)
+        self.runner._run_dag(self.dag, PDFAdapter, self.inputs, self.payload)
+        # C1: Trace a run.
+        #  Expect one span per node, inside the span of the DAG, and sampled
+        #  residual evaluations.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = Path(tmpdir) / "trace.json"
+            tracer.write(filename)
+            with open(filename, "r") as f:
+                events = json.load(f)["traceEvents"]
+        spans = [event for event in events if event["ph"] == "X"]
+        node_spans = [span for span in spans if span["cat"] == "node"]
+        self.assertEqual(
+            [span["name"] for span in node_spans],
+            ["a", "scale", "qdamp", "Uiso_0", "delta2", "all"],
+        )
+        (dag_span,) = [span for span in spans if span["cat"] == "dag"]
+        for span in node_spans:
+            self.assertGreaterEqual(span["ts"], dag_span["ts"])
+            self.assertLessEqual(
+                span["ts"] + span["dur"], dag_span["ts"] + dag_span["dur"]
+            )
+        self.assertTrue(any(span["cat"] == "residual" for span in spans))
+        # C2: Compare the node spans with the node metrics.
+        #  Expect the run time, without the time collecting the data.
+        for span in node_spans:
+            metrics = self.dag.nodes[span["args"]["id"]]["metrics"]
+            self.assertAlmostEqual(
+                span["dur"],
+                (metrics["wall_time"] - metrics["collect_time"]) * 1e6,
+            )
+
+    def test_snapshot_off(self):
+        adapter = PDFAdapter()
+        adapter.set_snapshot_policy(mode="off")
+        window_id = self.runner.watch(
+            lambda dag, node_id: True,
+            pname="ycalc_0",
+            update_mode="replace",
+            source="adapter",
+        )
+        # C1: Watch the snapshots of an adapter capturing none.
+        #  Expect the DAG to complete with no data for the window.
+        self.runner._run_dag(
+            self.dag, PDFAdapter, self.inputs, self.payload, adapter=adapter
+        )
+        self.assertTrue(
+            self.runner.is_marked(self.dag.leaf_nodes[0], "completed")
+        )
+        self.assertEqual(
+            self.runner.data_for_plot[window_id]["ydata"].drain(), []
+        )
+
+    def test_replay_data(self):
+        FitRunner()._run_dag(self.dag, PDFAdapter, self.inputs, self.payload)
+        payload_window = self.runner.watch(
+            lambda dag, node_id: True, pname="a", update_mode="append"
+        )
+        adapter_window = self.runner.watch(
+            lambda dag, node_id: True,
+            pname="ycalc_0",
+            update_mode="replace",
+            source="adapter",
+        )
+        # C1: Replay a DAG completed by another runner.
+        #  Expect the payload window to get the value of each node, and the
+        #  adapter window to get nothing.
+        self.runner.replay_data(self.dag)
+        self.assertEqual(
+            self.runner.data_for_plot[payload_window]["ydata"].drain(),
+            [
+                self.dag.nodes[node_id]["payload"]["a"]
+                for node_id in self.dag.topological_order
+            ],
+        )
+        self.assertEqual(
+            self.runner.data_for_plot[adapter_window]["ydata"].drain(), []
+        )
+
+    def test_subscribe(self):
+        # C1: Subscribe to the data collected at the end of each node.
+        #  Expect the callback to be called for each of the 6 nodes, and the
+        #  data version to be increased.
+        window_id = self.runner.watch(
+            lambda dag, node_id: True,
+            pname="a",
+            update_mode="append",
+            source="payload",
+        )
+        received = []
+        subscription_id = self.runner.subscribe(
+            lambda window_id, ydata: received.append((window_id, ydata))
+        )
+        self.runner._run_dag(self.dag, PDFAdapter, self.inputs, self.payload)
+        self.assertEqual(len(received), 6)
+        self.assertEqual(received[0][0], window_id)
+        self.assertEqual(self.runner.wait_for_data(0, timeout=0), 6)
+        # C2: Unsubscribe and wait for new data.
+        #  Expect the wait to time out with the same data version.
+        self.runner.unsubscribe(subscription_id)
+        self.assertEqual(self.runner.wait_for_data(timeout=0.01), 6)
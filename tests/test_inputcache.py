@@ -0,0 +1,35 @@
+import unittest
+import numpy
+from agents_for_diffpy.interface import InputCache
+
+
+class TestInputCache(unittest.TestCase):
+    def test_get(self):
+        # C1: Get the same text twice.
+        #  Expect one miss, then one hit returning the same object.
+        cache = InputCache(max_bytes=100)
+        key = cache.make_key("profile", "text", xmin=1.5)
+        obj = cache.get(key, lambda: ([1, 2], 10))
+        self.assertIs(cache.get(key, lambda: ([1, 2], 10)), obj)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # C2: Make the key with different settings.
+        #  Expect a different key.
+        self.assertNotEqual(key, cache.make_key("profile", "text", xmin=2))
+        # C3: Make the key with NumPy scalar settings.
+        #  Expect the same key as with the equal float settings.
+        self.assertEqual(
+            cache.make_key("profile", "text", xmin=numpy.float32(1.5)), key
+        )
+
+    def test_evict(self):
+        # C1: Add entries beyond the memory bound.
+        #  Expect the least recently used entry to be evicted.
+        cache = InputCache(max_bytes=100)
+        cache.get("a", lambda: ("a", 40))
+        cache.get("b", lambda: ("b", 40))
+        cache.get("a", lambda: ("a", 40))
+        cache.get("c", lambda: ("c", 40))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.nbytes, 80)
+        cache.get("b", lambda: ("new b", 40))
+        self.assertEqual(cache.misses, 4)
@@ -0,0 +1,85 @@
+from pathlib import Path
+from unittest import TestCase
+import numpy
+from scipy.optimize._numdiff import approx_derivative
+from agents_for_diffpy.interface import JacobianProvider, PDFAdapter
+
+
+class TestJacobianProvider(TestCase):
+    def setUp(self):
+        profile_path = Path("tests/data/Ni.gr")
+        structure_path = Path("tests/data/Ni.cif")
+        inputs = {
+            "profile_string": profile_path.read_text(),
+            "structure_string": structure_path.read_text(),
+            "xmin": 1.5,
+            "xmax": 50,
+            "dx": 0.01,
+            "qmax": 25.0,
+            "qmin": 0.1,
+        }
+        adapter = PDFAdapter()
+        adapter.load_inputs(inputs)
+        adapter.apply_payload({"scale": 0.4, "a": 3.52, "Uiso_0": 0.005})
+        adapter.free_parameters(["scale", "a"])
+        self.adapter = adapter
+
+    def test_jacobian(self):
+        # C1: Evaluate the Jacobian with both schemes in worker processes.
+        #  Expect the same Jacobian as the serial finite differences.
+        p = numpy.array(self.adapter._recipe.values)
+        for scheme in ["2-point", "3-point"]:
+            provider = JacobianProvider(scheme=scheme, max_workers=2)
+            jac = provider.jacobian(self.adapter, p)
+            provider.shutdown()
+            expected = approx_derivative(
+                self.adapter._residual, p, method=scheme
+            )
+            self.assertEqual(jac.shape, expected.shape)
+            self.assertTrue(numpy.allclose(jac, expected))
+        # C2: Evaluate the Jacobian with a relative step.
+        #  Expect the steps of the serial finite differences, relative to
+        #  the parameter values.
+        provider = JacobianProvider(rel_step=1e-4, max_workers=2)
+        jac = provider.jacobian(self.adapter, p)
+        expected = approx_derivative(
+            self.adapter._residual, p, method="2-point", rel_step=1e-4
+        )
+        self.assertTrue(numpy.allclose(jac, expected))
+        # C3: Update the adapter with a new profile and evaluate again.
+        #  Expect the workers to be kept, and to evaluate the new profile,
+        #  which the residual computed here is consistent with.
+        executor = provider._executor
+        lines = self.adapter.inputs["profile_string"].splitlines()
+        start = lines.index("#### start data") + 3
+        for i in range(start, len(lines)):
+            r, g = lines[i].split()[:2]
+            lines[i] = f"{r} {2 * float(g)}"
+        self.adapter.update_inputs(
+            dict(self.adapter.inputs, profile_string="\n".join(lines))
+        )
+        self.adapter.apply_payload({"scale": 0.4, "a": 3.52})
+        self.adapter.free_parameters(["scale", "a"])
+        p = numpy.array(self.adapter._recipe.values)
+        jac = provider.jacobian(self.adapter, p, f0=self.adapter._residual(p))
+        self.assertIs(provider._executor, executor)
+        expected = approx_derivative(
+            self.adapter._residual, p, method="2-point", rel_step=1e-4
+        )
+        self.assertTrue(numpy.allclose(jac, expected))
+        provider.shutdown()
+
+    def test_refine(self):
+        # C1: Refine with the parallel Jacobian.
+        #  Expect the same result as with the serial Jacobian.
+        other_adapter = self.adapter.clone()
+        self.adapter.action_func_factory(["scale", "a"])()
+        other_adapter.set_jacobian(parallel=True, max_workers=2)
+        other_adapter.action_func_factory(["scale", "a"])()
+        other_adapter._jacobian_provider.shutdown()
+        for pname in ["scale", "a"]:
+            self.assertAlmostEqual(
+                self.adapter.get_payload()[pname],
+                other_adapter.get_payload()[pname],
+                places=6,
+            )
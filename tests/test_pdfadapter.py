@@ -1,6 +1,8 @@
+import numpy
+import pickle
 from pathlib import Path
 from unittest import TestCase
-from agents_for_diffpy.interface import PDFAdapter
+from agents_for_diffpy.interface import PDFAdapter, input_cache, pool_registry
 
 
 class TestPDFAdapter(TestCase):
@@ -60,5 +62,183 @@ class TestPDFAdapter(TestCase):
     def test_clone(self):
         # C5: clone the adapter.
         #  Expect the cloned adapter to have the same payload as the original
+        self.adapter.apply_payload({"scale": 0.5})
+        self.adapter.action_func_factory(["scale"])()
         new_adapter = self.adapter.clone()
         self.assertEqual(new_adapter.get_payload(), self.adapter.get_payload())
+        # C6: clone the adapter.
+        #  Expect the cloned adapter to have the same free variables, to
+        #  share the observed profile, and to be independent of the original
+        recipe, new_recipe = self.adapter._recipe, new_adapter._recipe
+        self.assertEqual(new_recipe.getNames(), recipe.getNames())
+        self.assertIs(
+            new_recipe.pdfcontribution.profile.xobs,
+            recipe.pdfcontribution.profile.xobs,
+        )
+        new_adapter.apply_payload({"a": 3.6})
+        self.assertEqual(new_adapter.get_payload()["a"], 3.6)
+        self.assertNotEqual(self.adapter.get_payload()["a"], 3.6)
+        self.assertNotEqual(
+            sum(new_adapter._residual()), sum(self.adapter._residual())
+        )
+
+    def test_pickle(self):
+        self.adapter.apply_payload({"scale": 0.5})
+        self.adapter.free_parameters(["scale"])
+        # C1: Unpickle the adapter twice.
+        #  Expect copies with the same payload and free variables, and
+        #  independent recipes.
+        state = pickle.dumps(self.adapter)
+        first, second = pickle.loads(state), pickle.loads(state)
+        for adapter in (first, second):
+            self.assertEqual(adapter.get_payload(), self.adapter.get_payload())
+            self.assertEqual(adapter._recipe.getNames(), ["scale"])
+        self.assertIsNot(first._recipe, second._recipe)
+        first.apply_payload({"a": 3.6})
+        self.assertNotEqual(second.get_payload()["a"], 3.6)
+
+    def test_update_inputs(self):
+        # C1: Update the inputs with a profile on the same r-grid.
+        #  Expect the profile to be swapped into the same recipe, and the
+        #  parameter values and fix/free status to be reset.
+        recipe = self.adapter._recipe
+        profile = recipe._contributions["pdfcontribution"].profile
+        y_before = profile.y.copy()
+        initial_payload = self.adapter.get_payload()
+        self.adapter.apply_payload({"scale": 0.5})
+        self.adapter.action_func_factory(["scale"])()
+        lines = self.inputs["profile_string"].splitlines()
+        start = lines.index("#### start data") + 3
+        for i in range(start, len(lines)):
+            r, g = lines[i].split()[:2]
+            lines[i] = f"{r} {2 * float(g)}"
+        inputs = dict(self.inputs, profile_string="\n".join(lines))
+        self.assertTrue(self.adapter.update_inputs(inputs))
+        self.assertIs(self.adapter._recipe, recipe)
+        self.assertEqual(self.adapter.get_payload(), initial_payload)
+        self.assertEqual(recipe.getNames(), [])
+        self.assertTrue(numpy.allclose(profile.y, 2 * y_before))
+        # C2: Update the inputs with a different calculation range.
+        #  Expect the recipe to be rebuilt.
+        inputs = dict(self.inputs, xmax=30)
+        self.assertFalse(self.adapter.update_inputs(inputs))
+        self.assertIsNot(self.adapter._recipe, recipe)
+        # C3: Update the inputs with a profile whose header sets another
+        #  qmin, read by the generator.
+        #  Expect the recipe to be rebuilt.
+        recipe = self.adapter._recipe
+        profile_string = inputs["profile_string"].replace(
+            "qmin = 0.5", "qmin = 0.6"
+        )
+        self.assertFalse(
+            self.adapter.update_inputs(
+                dict(inputs, profile_string=profile_string)
+            )
+        )
+        self.assertIsNot(self.adapter._recipe, recipe)
+
+    def test_input_cache(self):
+        # C1: Load the same inputs again.
+        #  Expect the parsed structure and profile to come from the cache,
+        #  and the structure to be a private copy.
+        hits = input_cache.hits
+        adapter = PDFAdapter()
+        adapter.load_inputs(self.inputs)
+        self.assertEqual(input_cache.hits, hits + 2)
+        self.assertIsNot(
+            adapter._recipe.pdfcontribution.pdfgenerator.stru,
+            self.adapter._recipe.pdfcontribution.pdfgenerator.stru,
+        )
+
+    def test_pool(self):
+        # C1: Build a recipe with a pool of two processes, configure the
+        #  pool again, and evaluate the recipe.
+        #  Expect the same residual, computed with the new pool.
+        ncpu = pool_registry._ncpu
+        try:
+            pool_registry.configure(ncpu=2)
+            adapter = PDFAdapter()
+            adapter.load_inputs(self.inputs)
+            chiv = adapter._residual()
+            pool_registry.configure(ncpu=2)
+            self.assertTrue(numpy.allclose(adapter._residual(), chiv))
+            self.assertTrue(pool_registry.started)
+        finally:
+            pool_registry.configure(ncpu=ncpu)
+
+    def test_residual(self):
+        # C1: Evaluate the residual with snapshots.
+        #  Expect the snapshots to hold the calculated, observed and
+        #  difference profiles of the evaluation.
+        self.adapter.apply_payload({"scale": 0.4, "a": 3.52})
+        self.adapter._residual()
+        profile = self.adapter._recipe.pdfcontribution.profile
+        snapshots = self.adapter.snapshots
+        self.assertTrue(numpy.array_equal(snapshots["ycalc_0"], profile.ycalc))
+        self.assertTrue(
+            numpy.allclose(
+                snapshots["ydiff_0"], snapshots["ycalc_0"] - snapshots["y_0"]
+            )
+        )
+        # C2: Evaluate the residual without snapshots.
+        #  Expect the snapshots to be left unchanged.
+        ycalc = snapshots["ycalc_0"]
+        self.adapter.apply_payload({"scale": 0.5})
+        self.adapter._residual(snapshot=False)
+        self.assertIs(self.adapter.snapshots["ycalc_0"], ycalc)
+
+    def test_snapshot_policy(self):
+        # C1: Turn the snapshots off.
+        #  Expect no snapshot after the residual evaluation.
+        self.adapter.set_snapshot_policy(mode="off")
+        self.adapter._residual()
+        self.assertEqual(self.adapter.snapshots, {})
+        # C2: Keep two snapshots and evaluate three times.
+        #  Expect the two most recent calculated profiles in the history.
+        self.adapter.set_snapshot_policy(mode="always", capacity=2)
+        ycalcs = []
+        for scale in [0.3, 0.4, 0.5]:
+            self.adapter.apply_payload({"scale": scale})
+            self.adapter._residual()
+            ycalcs.append(self.adapter.snapshots["ycalc_0"].copy())
+        history = self.adapter.get_snapshot_history("ycalc_0")
+        self.assertEqual(history.shape[0], 2)
+        self.assertTrue(numpy.array_equal(history[0], ycalcs[1]))
+        self.assertTrue(numpy.array_equal(history[1], ycalcs[2]))
+        # C3: Keep one snapshot, and evaluate again after publishing it.
+        #  Expect the published profiles to be read-only views of the ring,
+        #  holding the latest evaluation, and no evaluation kept without a
+        #  Jacobian provider.
+        self.adapter.set_snapshot_policy(mode="always", capacity=1)
+        self.adapter._residual()
+        published = dict(self.adapter.snapshots)
+        self.adapter.apply_payload({"scale": 0.7})
+        self.adapter._residual()
+        profile = self.adapter._recipe.pdfcontribution.profile
+        self.assertTrue(numpy.array_equal(published["ycalc_0"], profile.ycalc))
+        self.assertTrue(
+            numpy.allclose(published["ydiff_0"], profile.ycalc - profile.y)
+        )
+        self.assertFalse(published["ydiff_0"].flags.writeable)
+        self.assertIsNone(self.adapter._last_evaluation)
+        # C4: Capture only the improvements, then load a new profile with a
+        #  worse fit.
+        #  Expect the new profile to be captured, with a cleared history.
+        self.adapter.set_snapshot_policy(mode="improve")
+        self.adapter._residual()
+        lines = self.inputs["profile_string"].splitlines()
+        start = lines.index("#### start data") + 3
+        for i in range(start, len(lines)):
+            r, g = lines[i].split()[:2]
+            lines[i] = f"{r} {10 * float(g)}"
+        self.adapter.update_inputs(
+            dict(self.inputs, profile_string="\n".join(lines))
+        )
+        self.assertEqual(self.adapter.snapshots, {})
+        self.adapter._residual()
+        self.assertIn("ycalc_0", self.adapter.snapshots)
+        self.assertEqual(len(self.adapter.get_snapshot_history("ycalc_0")), 1)
+        # C5: Pickle the adapter.
+        #  Expect the snapshot policy to be kept.
+        adapter = pickle.loads(pickle.dumps(self.adapter))
+        self.assertEqual(adapter.snapshot_policy.mode, "improve")
@@ -0,0 +1,50 @@
+import unittest
+from agents_for_diffpy.interface import PoolRegistry
+
+
+class TestPoolRegistry(unittest.TestCase):
+    def test_get_pool(self):
+        # C1: Request the pool twice.
+        #  Expect the pool to be created lazily and reused.
+        registry = PoolRegistry(ncpu=2)
+        self.assertFalse(registry.started)
+        pool = registry.get_pool()
+        self.assertTrue(registry.started)
+        self.assertIs(registry.get_pool(), pool)
+        self.assertEqual(pool.map(abs, [-1, -2]), [1, 2])
+        # C2: Shut down the registry.
+        #  Expect a new pool on the next request.
+        registry.shutdown()
+        self.assertFalse(registry.started)
+        new_pool = registry.get_pool()
+        self.assertIsNot(new_pool, pool)
+        registry.shutdown()
+
+    def test_configure(self):
+        # C1: Configure the registry with a single process.
+        #  Expect no pool to be created.
+        registry = PoolRegistry(ncpu=2)
+        registry.get_pool()
+        registry.configure(ncpu=1)
+        self.assertFalse(registry.started)
+        self.assertIsNone(registry.get_pool())
+        # C2: Configure the registry with an invalid number of processes.
+        #  Expect ValueError.
+        with self.assertRaises(ValueError):
+            registry.configure(ncpu=0)
+
+    def test_map(self):
+        # C1: Map with the registry, configure it, and map again.
+        #  Expect the new pool to be used instead of the closed one.
+        registry = PoolRegistry(ncpu=2)
+        mapfunc = registry.map
+        self.assertEqual(mapfunc(abs, [-1, -2]), [1, 2])
+        pool = registry._pool
+        registry.configure(ncpu=3)
+        self.assertEqual(mapfunc(abs, [-1, -2, -3]), [1, 2, 3])
+        self.assertIsNot(registry._pool, pool)
+        # C2: Configure the registry with a single process, and map.
+        #  Expect the function mapped serially, with no pool.
+        registry.configure(ncpu=1)
+        self.assertEqual(mapfunc(abs, [-4]), [4])
+        self.assertFalse(registry.started)
@@ -0,0 +1,93 @@
+import tempfile
+import unittest
+from pathlib import Path
+from agents_for_diffpy.interface import ProfileRegistry
+
+
+class TestProfileRegistry(unittest.TestCase):
+    def test_add(self):
+        registry = ProfileRegistry()
+        # C1: Add profiles out of order within a batch of equal orders.
+        #  Expect the profiles to be sorted by their order.
+        self.assertTrue(registry.add(Path("10K.gr"), 10))
+        self.assertTrue(registry.add(Path("20K.gr"), 20))
+        self.assertTrue(registry.add(Path("20K_b.gr"), 20))
+        self.assertEqual(
+            registry.known,
+            [Path("10K.gr"), Path("20K.gr"), Path("20K_b.gr")],
+        )
+        self.assertEqual(registry.index(Path("20K_b.gr")), 2)
+        # C2: Add a known profile again.
+        #  Expect it to be ignored.
+        self.assertFalse(registry.add(Path("10K.gr"), 10))
+        self.assertEqual(len(registry), 3)
+        # C3: Add a profile with a lower order than the last one.
+        #  Expect ValueError.
+        with self.assertRaises(ValueError):
+            registry.add(Path("5K.gr"), 5)
+
+    def test_finished(self):
+        registry = ProfileRegistry()
+        for order in (1, 2, 3):
+            registry.add(Path(f"{order}K.gr"), order)
+        # C1: Finish the profiles out of order.
+        #  Expect the others to be pending, in order.
+        registry.mark_finished(Path("2K.gr"))
+        self.assertEqual(registry.pending(), [Path("1K.gr"), Path("3K.gr")])
+        registry.mark_finished(Path("1K.gr"))
+        self.assertEqual(registry.pending(), [Path("3K.gr")])
+        self.assertTrue(registry.is_finished(Path("1K.gr")))
+        # C2: Finish an unknown profile.
+        #  Expect KeyError.
+        with self.assertRaises(KeyError):
+            registry.mark_finished(Path("4K.gr"))
+
+    def test_pending(self):
+        registry = ProfileRegistry()
+        for order in (1, 2, 3):
+            registry.add(Path(f"{order}K.gr"), order)
+        # C1: Finish no profile.
+        #  Expect no profile to seed the next fit.
+        self.assertIsNone(registry.last_finished())
+        # C2: Finish every profile, then mark the second one pending.
+        #  Expect the second and third profiles to be pending, and the
+        #  first one to seed the next fit.
+        for order in (1, 2, 3):
+            registry.mark_finished(Path(f"{order}K.gr"))
+        self.assertEqual(registry.last_finished(), Path("3K.gr"))
+        registry.mark_pending(Path("2K.gr"))
+        registry.mark_pending(Path("3K.gr"))
+        self.assertEqual(registry.pending(), [Path("2K.gr"), Path("3K.gr")])
+        self.assertEqual(registry.last_finished(), Path("1K.gr"))
+        self.assertFalse(registry.is_finished(Path("2K.gr")))
+
+    def test_state_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            state_file = Path(tmpdir) / "profiles.jsonl"
+            registry = ProfileRegistry(state_file)
+            for order in (1, 2, 3):
+                registry.add(Path(f"{order}K.gr"), order)
+            registry.mark_finished(Path("1K.gr"))
+            # C1: Restore the registry, with a last update cut by a crash.
+            #  Expect the complete updates to be restored.
+            with open(state_file, "a") as f:
+                f.write('{"finished": "2K')
+            restored = ProfileRegistry(state_file)
+            self.assertEqual(restored.known, registry.known)
+            self.assertEqual(restored.finished, [Path("1K.gr")])
+            self.assertEqual(
+                restored.pending(), [Path("2K.gr"), Path("3K.gr")]
+            )
+            # C2: Update the restored registry and restore it again.
+            #  Expect the update to be restored.
+            restored.mark_finished(Path("2K.gr"))
+            self.assertEqual(
+                ProfileRegistry(state_file).pending(), [Path("3K.gr")]
+            )
+            # C3: Mark a finished profile pending and restore the registry.
+            #  Expect the profile to be pending.
+            restored.mark_pending(Path("1K.gr"))
+            self.assertEqual(
+                ProfileRegistry(state_file).pending(),
+                [Path("1K.gr"), Path("3K.gr")],
+            )
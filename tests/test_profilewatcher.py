@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from agents_for_diffpy.interface import ProfileWatcher
+from agents_for_diffpy.interface.ProfileWatcher import (
+    _EVENT_HEADER,
+    IN_Q_OVERFLOW,
+)
+
+
+class TestProfileWatcher(unittest.TestCase):
+    def check_backend(self, backend):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            folder = Path(tmpdir)
+            (folder / "Ni_5K.gr").write_text("data")
+            (folder / "notes.txt").write_text("notes")
+            writing = open(folder / "Ni_7K.gr", "w")
+            writing.write("data")
+            writing.flush()
+            watcher = ProfileWatcher(folder, r"(\d+)K\.gr", backend=backend)
+            # C1: Poll the folder for the first time, while a file present
+            #  at the start is still being written.
+            #  Expect only the complete matching file to be reported.
+            writing.write("more data")
+            writing.flush()
+            self.assertEqual(watcher.poll(), [folder / "Ni_5K.gr"])
+            # C2: Finish writing the file and poll until it is reported.
+            #  Expect the file to be reported once.
+            writing.close()
+            new_files = []
+            for _ in range(10):
+                new_files.extend(watcher.poll(timeout=0.01))
+            self.assertEqual(new_files, [folder / "Ni_7K.gr"])
+            # C3: Write a new file and poll the folder until it is reported.
+            #  Expect the new file to be reported once.
+            (folder / "Ni_10K.gr").write_text("data")
+            new_files = []
+            for _ in range(10):
+                new_files.extend(watcher.poll(timeout=0.01))
+            self.assertEqual(new_files, [folder / "Ni_10K.gr"])
+            watcher.close()
+
+    def test_poll(self):
+        self.check_backend("poll")
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "Linux only")
+    def test_inotify(self):
+        self.check_backend("inotify")
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "Linux only")
+    def test_inotify_overflow(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            folder = Path(tmpdir)
+            watcher = ProfileWatcher(folder, r"(\d+)K\.gr", backend="inotify")
+            # The kernel queue is replaced by a pipe to send an overflow.
+            os.close(watcher._fd)
+            watcher._fd, write_fd = os.pipe()
+            writing = open(folder / "Ni_7K.gr", "w")
+            writing.write("data")
+            writing.flush()
+            # C1: Poll after an overflow, while a file is being written.
+            #  Expect the file not to be reported.
+            os.write(write_fd, _EVENT_HEADER.pack(-1, IN_Q_OVERFLOW, 0, 0))
+            self.assertEqual(watcher.poll(), [])
+            writing.write("more data")
+            writing.flush()
+            self.assertEqual(watcher.poll(), [])
+            # C2: Finish writing the file and poll again.
+            #  Expect the file to be reported once, as it did not change
+            #  since the last poll.
+            writing.close()
+            self.assertEqual(watcher.poll(), [folder / "Ni_7K.gr"])
+            self.assertEqual(watcher.poll(), [])
+            watcher.close()
+            os.close(write_fd)
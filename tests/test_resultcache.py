@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from agents_for_diffpy.interface import ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+    def test_make_key(self):
+        # C1: Make keys from the same parts in another order.
+        #  Expect the same key.
+        key = ResultCache.make_key(payload={"a": 1.0, "b": 2.0}, action=["a"])
+        self.assertEqual(
+            key,
+            ResultCache.make_key(action=["a"], payload={"b": 2.0, "a": 1.0}),
+        )
+        # C2: Make a key with another payload.
+        #  Expect another key.
+        self.assertNotEqual(
+            key,
+            ResultCache.make_key(payload={"a": 1.5, "b": 2.0}, action=["a"]),
+        )
+
+    def test_get(self):
+        cache = ResultCache(max_bytes=25)
+        # C1: Get a payload that was not cached.
+        #  Expect None and a miss.
+        self.assertIsNone(cache.get("key0"))
+        self.assertEqual(cache.misses, 1)
+        # C2: Cache a payload and get it back.
+        #  Expect an equal copy and a hit.
+        cache.put("key0", {"a": 1.0})
+        payload = cache.get("key0")
+        self.assertEqual(payload, {"a": 1.0})
+        payload["a"] = 2.0
+        self.assertEqual(cache.get("key0"), {"a": 1.0})
+        self.assertEqual(cache.hits, 2)
+        # C3: Cache payloads beyond the memory bound.
+        #  Expect the least recently used payload to be evicted.
+        cache.put("key1", {"a": 2.0})
+        cache.put("key2", {"a": 3.0})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("key0"))
+
+    def test_directory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ResultCache(directory=tmpdir).put("key0", {"a": 1.0})
+            # C1: Get a payload cached by another cache on the same
+            #  directory.
+            #  Expect the payload.
+            self.assertEqual(
+                ResultCache(directory=tmpdir).get("key0"), {"a": 1.0}
+            )
+
+    def test_disk_bound(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ResultCache(directory=tmpdir, max_disk_bytes=25)
+            # C1: Cache payloads beyond the disk bound.
+            #  Expect the oldest file to be deleted.
+            for i in range(3):
+                cache.put(f"key{i}", {"a": float(i)})
+                path = Path(tmpdir) / f"key{i}.json"
+                os.utime(path, ns=(i * 10**9, i * 10**9))
+            self.assertEqual(
+                sorted(os.listdir(tmpdir)), ["key1.json", "key2.json"]
+            )
+            self.assertEqual(cache.disk_nbytes, 20)
+            # C2: Open a new cache on the same directory.
+            #  Expect the size of the directory to be counted.
+            self.assertEqual(ResultCache(directory=tmpdir).disk_nbytes, 20)
@@ -0,0 +1,74 @@
+import unittest
+import numpy
+from agents_for_diffpy.interface import FitDAG, ResultsStore
+
+
+def make_dag(a, scale):
+    dag = FitDAG()
+    dag.from_str("scale->a")
+    for node_id, node_content in dag.nodes(data=True):
+        if node_content["name"] == "scale":
+            node_content["payload"] = {"scale": scale, "a": 3.5}
+        else:
+            node_content["payload"] = {
+                "scale": scale,
+                "a": a,
+                "note": "not numeric",
+            }
+    return dag
+
+
+class TestResultsStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ResultsStore(":memory:")
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_column(self):
+        # C1: Append profiles out of order.
+        #  Expect the columns to be sorted by the profile order.
+        self.store.append("Ni_20K", make_dag(3.6, 0.2), order=20)
+        self.store.append("Ni_10K", make_dag(3.5, 0.1), order=10)
+        self.assertEqual(self.store.profiles(), ["Ni_10K", "Ni_20K"])
+        orders, values = self.store.column("a")
+        numpy.testing.assert_array_equal(orders, [10, 20])
+        numpy.testing.assert_array_equal(values, [3.5, 3.6])
+        # C2: Read the values of an intermediate node.
+        #  Expect the values of that node.
+        _, values = self.store.column("a", node=0)
+        numpy.testing.assert_array_equal(values, [3.5, 3.5])
+        # C3: Read an unknown parameter.
+        #  Expect empty arrays.
+        orders, values = self.store.column("qdamp")
+        self.assertEqual(len(orders), 0)
+        self.assertEqual(len(values), 0)
+
+    def test_payload(self):
+        self.store.append("Ni_10K", make_dag(3.5, 0.1), order=10)
+        # C1: Get the final payload.
+        #  Expect only the numeric values.
+        self.assertEqual(
+            self.store.payload("Ni_10K"), {"scale": 0.1, "a": 3.5}
+        )
+        # C2: Append the same profile again.
+        #  Expect the results to be replaced.
+        self.store.append("Ni_10K", make_dag(3.7, 0.1), order=10)
+        self.assertEqual(self.store.payload("Ni_10K")["a"], 3.7)
+        self.assertEqual(len(self.store.column("a")[1]), 1)
+        # C3: Get the payload of an unknown profile.
+        #  Expect KeyError.
+        with self.assertRaises(KeyError):
+            self.store.payload("Ni_30K")
+
+    def test_repeated_names(self):
+        dag = FitDAG()
+        dag.from_str("a->all->a->all")
+        for index, node_id in enumerate(dag.topological_order):
+            dag.nodes[node_id]["payload"] = {"a": 3.5 + index / 10}
+        # C1: Store a DAG whose node names are repeated.
+        #  Expect the payload of each node to be kept apart.
+        self.store.append("Ni_10K", dag, order=10)
+        self.assertEqual(self.store.payload("Ni_10K", node=0), {"a": 3.5})
+        self.assertEqual(self.store.payload("Ni_10K", node=2), {"a": 3.7})
+        self.assertEqual(self.store.payload("Ni_10K"), {"a": 3.8})
@@ -0,0 +1,41 @@
+import unittest
+import numpy
+from agents_for_diffpy.interface import RingBuffer
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_append(self):
+        # C1: Append more values than the capacity.
+        #  Expect the most recent values to be kept, oldest first.
+        ring = RingBuffer(3)
+        ring.extend([1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(list(ring.to_array()), [2.0, 3.0, 4.0])
+        self.assertEqual(ring.latest(), 4.0)
+        # C2: Append arrays.
+        #  Expect the values to be copied into preallocated slots.
+        ring = RingBuffer(2, shape=(3,))
+        value = numpy.ones(3)
+        slot = ring.append(value)
+        value[0] = 5.0
+        self.assertEqual(list(slot), [1.0, 1.0, 1.0])
+        ring.append(2 * numpy.ones(3))
+        ring.append(3 * numpy.ones(3))
+        self.assertEqual(list(slot), [3.0, 3.0, 3.0])
+        # C3: Append an array of a different shape.
+        #  Expect the ring to be reallocated.
+        ring.append(numpy.zeros(5))
+        self.assertEqual(ring.shape, (5,))
+        self.assertEqual(len(ring), 1)
+
+    def test_claim(self):
+        # C1: Write values in place in claimed slots.
+        #  Expect the values stored without another array.
+        ring = RingBuffer(2)
+        slot = ring.claim((3,))
+        numpy.add(numpy.ones(3), 1.0, out=slot)
+        ring.claim((3,))[:] = 3.0
+        self.assertEqual(ring.to_array().tolist(), [[2.0] * 3, [3.0] * 3])
+        # C2: Claim more slots than the capacity.
+        #  Expect the oldest slot to be reused.
+        self.assertTrue(numpy.shares_memory(ring.claim((3,)), slot))
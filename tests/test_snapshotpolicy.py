@@ -0,0 +1,33 @@
+import unittest
+import numpy
+from agents_for_diffpy.interface import SnapshotPolicy
+
+
+class TestSnapshotPolicy(unittest.TestCase):
+    def test_should_capture(self):
+        chiv = numpy.ones(4)
+        # C1: Capture every third evaluation.
+        #  Expect the first, fourth and seventh evaluations to be captured.
+        policy = SnapshotPolicy(mode="every", every=3)
+        captured = [policy.should_capture(chiv) for _ in range(7)]
+        self.assertEqual(
+            captured, [True, False, False, True, False, False, True]
+        )
+        # C2: Capture at most once per hour.
+        #  Expect only the first evaluation to be captured.
+        policy = SnapshotPolicy(mode="interval", interval_ms=3.6e6)
+        captured = [policy.should_capture(chiv) for _ in range(3)]
+        self.assertEqual(captured, [True, False, False])
+        # C3: Capture on improvement.
+        #  Expect only the evaluations lowering chi^2 to be captured.
+        policy = SnapshotPolicy(mode="improve")
+        captured = [policy.should_capture(c * chiv) for c in [2, 3, 1, 1]]
+        self.assertEqual(captured, [True, False, True, False])
+        # C4: Turn the capture off.
+        #  Expect nothing to be captured.
+        policy = SnapshotPolicy(mode="off")
+        self.assertFalse(policy.should_capture(chiv))
+        # C5: Use an unknown mode.
+        #  Expect ValueError.
+        with self.assertRaises(ValueError):
+            SnapshotPolicy(mode="sometimes")
@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from agents_for_diffpy.interface import Tracer
+
+
+class TestTracer(unittest.TestCase):
+    def test_span(self):
+        tracer = Tracer()
+        # C1: Record a block as a span.
+        #  Expect a complete event in microseconds, with its details.
+        with tracer.span("load inputs", category="runner", profile="10K"):
+            pass
+        start = tracer.now()
+        tracer.add_span("node", start, start + 0.5, category="node")
+        self.assertEqual(len(tracer), 2)
+        event = tracer._events[0]
+        self.assertEqual(event["ph"], "X")
+        self.assertEqual(event["args"], {"profile": "10K"})
+        self.assertEqual(event["pid"], os.getpid())
+        self.assertAlmostEqual(tracer._events[1]["dur"], 5e5)
+        # C2: Record a span ending before it starts.
+        #  Expect a zero duration.
+        tracer.add_span("node", start, start - 1)
+        self.assertEqual(tracer._events[2]["dur"], 0)
+        # C3: Clear the tracer.
+        #  Expect no span.
+        tracer.clear()
+        self.assertEqual(len(tracer), 0)
+
+    def test_write(self):
+        tracer = Tracer()
+        start = tracer.now()
+        tracer.add_span("a", start, start + 1, category="node")
+        tracer.add_span("b", start, start + 1, pid=1, tid=1)
+        # C1: Write spans of this process and of a worker process.
+        #  Expect a lane named after the thread and one after the worker.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = Path(tmpdir) / "trace.json"
+            tracer.write(filename)
+            with open(filename, "r") as f:
+                trace = json.load(f)
+        events = trace["traceEvents"]
+        self.assertEqual(
+            [event["name"] for event in events if event["ph"] == "X"],
+            ["a", "b"],
+        )
+        lanes = {
+            event["pid"]: event["args"]["name"]
+            for event in events
+            if event["ph"] == "M"
+        }
+        self.assertEqual(lanes[1], "worker 1")
+        self.assertEqual(lanes[os.getpid()], "MainThread")
+
+    def test_flush(self):
+        tracer = Tracer(max_events=2)
+        start = tracer.now()
+        # C1: Record more spans than kept in memory.
+        #  Expect the oldest spans dropped.
+        for name in ["a", "b", "c"]:
+            tracer.add_span(name, start, start + 1)
+        self.assertEqual(
+            [event["name"] for event in tracer._events], ["b", "c"]
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = Path(tmpdir) / "trace.json"
+            # C2: Flush twice to the same file.
+            #  Expect the spans appended once each, the lane named once,
+            #  and no span left in memory.
+            tracer.flush(filename)
+            self.assertEqual(len(tracer), 0)
+            tracer.add_span("d", start, start + 1)
+            tracer.flush(filename)
+            tracer.flush(filename)
+            with open(filename, "r") as f:
+                text = f.read()
+            # The closing bracket is optional in the JSON array format.
+            events = json.loads(text.rstrip().rstrip(",") + "]")
+            self.assertEqual(
+                [event["name"] for event in events if event["ph"] == "X"],
+                ["b", "c", "d"],
+            )
+            self.assertEqual(
+                len([event for event in events if event["ph"] == "M"]), 1
+            )
+            # C3: Flush to another file.
+            #  Expect a new trace, starting with the name of the lane.
+            tracer.add_span("e", start, start + 1)
+            other = Path(tmpdir) / "other.json"
+            tracer.flush(other)
+            with open(other, "r") as f:
+                events = json.loads(f.read().rstrip().rstrip(",") + "]")
+            self.assertEqual([event["ph"] for event in events], ["M", "X"])